@@ -58,7 +58,7 @@ def find_optimal_assignment(estimates, scaffs, *, unmatched_penalty=2.0):
     return np.zeros((0, 2), dtype=np.int_)
 
 
-def analysis_plots(
+def prepare_matching(
     scaffold_sizes,
     estimates,
     *,
@@ -67,8 +67,9 @@ def analysis_plots(
     max_scaffolds=-1,
     by_name=False,
     no_optimize=False,
-    plotlib="pyqtgraph",
 ):
+    """Return the filtered and sorted `scaffold_sizes` and `estimates` and
+    their matching as pairs `(estimate, scaffold)` of positions."""
     scaffold_sizes = pd.Series(scaffold_sizes)
     if min_scaffold_size > 0:
         scaffold_sizes = scaffold_sizes.loc[scaffold_sizes >= min_scaffold_size]
@@ -102,6 +103,36 @@ def analysis_plots(
             "could not find an optimal matching; resorting to identity matching"
         )
 
+    return scaffold_sizes, estimates, matching
+
+
+def matching_dataframe(scaffold_sizes, estimates, matching):
+    """Return the `matching` (see `prepare_matching`) as table."""
+    matching = np.asarray(matching)
+    chromosome_sizes = estimates.iloc[matching[:, 0]]
+    scaffold_sizes = scaffold_sizes.iloc[matching[:, 1]]
+
+    return pd.DataFrame(
+        {
+            "chromosome": chromosome_sizes.index,
+            "chromosome_size": chromosome_sizes.array,
+            "scaffold": scaffold_sizes.index,
+            "scaffold_size": scaffold_sizes.array,
+        }
+    )
+
+
+def analysis_plots(
+    scaffold_sizes,
+    estimates,
+    *,
+    plotlib="pyqtgraph",
+    **kwargs,
+):
+    scaffold_sizes, estimates, matching = prepare_matching(
+        scaffold_sizes, estimates, **kwargs
+    )
+
     if "." in plotlib:
         raise ValueError("plotlib must not contain dots ('.')")
 
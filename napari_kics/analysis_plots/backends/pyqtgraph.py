@@ -8,7 +8,7 @@ import pyqtgraph.exporters
 from pyqtgraph.icons import invisibleEye
 from pyqtgraph.Qt import QtCore, QtGui, QtWidgets, mkQApp
 
-from .. import get_initial_bounds, size_correlation
+from .. import get_initial_bounds, matching_dataframe, size_correlation
 
 log = logging.getLogger(__name__)
 
@@ -649,16 +649,8 @@ class MainWindow(QtWidgets.QMainWindow):
         self._hideCrossHair(hide=False)
 
     def matching_dataframe(self):
-        chromosome_sizes = self.estimates.iloc[self.matching[:, 1]]
-        scaffold_sizes = self.scaffoldSizes.iloc[self.matching[:, 0]]
-
-        return pd.DataFrame(
-            {
-                "chromosome": chromosome_sizes.index,
-                "chromosome_size": chromosome_sizes.array,
-                "scaffold": scaffold_sizes.index,
-                "scaffold_size": scaffold_sizes.array,
-            }
+        return matching_dataframe(
+            self.scaffoldSizes, self.estimates, np.fliplr(self.matching)
         )
 
     def save(self):
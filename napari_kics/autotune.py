@@ -0,0 +1,184 @@
+"""Automatic search of the preprocessing parameters.
+
+Candidates `(invert_image, blur, threshold)` are scored by how well the
+connected components of the thresholded image match the expected number of
+chromosomes (see `score_components`). The candidates sharing `invert_image`
+and `blur` are evaluated on the same blurred image, so each blur is computed
+only once.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from .preprocessing import apply_blur, apply_invert, apply_threshold, label, to_gray
+from .utils.shared_arrays import SharedArrayRegistry
+
+default_sigmas = tuple(np.round(np.linspace(0, 3, 7), 2))
+default_thresholds = tuple(np.round(np.linspace(0.05, 0.95, 19), 3))
+
+
+def score_components(areas, expected_count, *, min_size=0.1, max_size=4.0):
+    """Return how badly the component `areas` match `expected_count`
+    chromosomes (0 is a perfect match).
+
+    Components smaller than `min_size` or larger than `max_size` times the
+    mean chromosome area are considered noise or merged chromosomes. The score
+    is the relative error of the number of the remaining components plus the
+    fraction of the total area covered by noise and merged components.
+    """
+    areas = np.asarray(areas)
+    total = areas.sum()
+    if total == 0:
+        return np.inf
+
+    mean_area = total / expected_count
+    outliers = (areas < min_size * mean_area) | (areas > max_size * mean_area)
+    count_error = abs(len(areas) - outliers.sum() - expected_count) / expected_count
+
+    return count_error + areas[outliers].sum() / total
+
+
+def component_areas(thresholded):
+    """Return the areas of the connected components of `thresholded`."""
+    return np.bincount(label(thresholded).ravel())[1:]
+
+
+def blur_into(gray, invert_image, sigma, blurred):
+    """Blur the shared image `gray` into the shared array `blurred`."""
+    image = gray.attach()
+    blurred.attach()[...] = apply_blur(apply_invert(image, invert_image), sigma)
+
+    del image
+    gray.detach()
+    blurred.detach()
+
+
+def evaluate_thresholds(blurred, thresholds, expected_count):
+    """Score all `thresholds` on the shared blurred image `blurred`."""
+    image = blurred.attach()
+
+    results = []
+    for threshold in thresholds:
+        areas = component_areas(apply_threshold(image, threshold))
+        areas = areas[areas > 0]
+        results.append(
+            {
+                "threshold": float(threshold),
+                "num_components": len(areas),
+                "score": score_components(areas, expected_count),
+            }
+        )
+
+    del image
+    blurred.detach()
+
+    return results
+
+
+def autotune(
+    image,
+    expected_count,
+    *,
+    invert_image=(False, True),
+    sigmas=default_sigmas,
+    thresholds=default_thresholds,
+    refine=True,
+    jobs=None,
+):
+    """Evaluate the grid of preprocessing parameters on `image` in `jobs`
+    worker processes.
+
+    The images are handed to the workers in shared memory: every blurred
+    image is computed once and the thresholds are evaluated on it by all
+    workers. With `refine`, the thresholds around the best candidate are
+    evaluated once more at a ten times finer step on its blurred image.
+    Returns all candidates with their `num_components` and `score` sorted by
+    score, best first.
+    """
+    # the workers import this module, so pandas is only imported here
+    import pandas as pd
+
+    if len(invert_image) == 0 or len(sigmas) == 0 or len(thresholds) == 0:
+        raise ValueError("invert_image, sigmas and thresholds must not be empty")
+
+    gray = to_gray(image)
+    workers = jobs or os.cpu_count() or 1
+
+    def rank(result):
+        # the order of the returned table
+        return result["score"], result["blur"], result["threshold"]
+
+    # spawn, as forking the (possibly multi-threaded) GUI process is unsafe
+    with SharedArrayRegistry() as registry, ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+    ) as executor:
+        gray_handle = registry.share(gray)
+        results = []
+        # the best result so far and its blurred image (kept for `refine`)
+        best = None
+
+        def evaluate(candidate, thresholds, num_chunks):
+            """Evaluate `thresholds` on the blurred image of `candidate`
+            `(invert, sigma, blurred)` in `num_chunks` tasks."""
+            futures = {}
+            for chunk in np.array_split(thresholds, num_chunks):
+                if len(chunk) > 0:
+                    future = executor.submit(
+                        evaluate_thresholds,
+                        registry.acquire(candidate[2]),
+                        chunk,
+                        expected_count,
+                    )
+                    futures[future] = candidate
+
+            return futures
+
+        def collect(futures):
+            nonlocal best
+            for future in as_completed(futures):
+                invert, sigma, blurred = futures[future]
+                for result in future.result():
+                    result = {"invert_image": invert, "blur": sigma, **result}
+                    results.append(result)
+                    if best is None or rank(result) < rank(best[0]):
+                        if best is None or best[1] != blurred:
+                            registry.acquire(blurred)
+                            if best is not None:
+                                registry.release(best[1])
+                        best = (result, blurred)
+                registry.release(blurred)
+
+        blur_futures = {}
+        for invert in invert_image:
+            for sigma in sigmas:
+                blurred = registry.empty(gray.shape, gray.dtype)
+                future = executor.submit(blur_into, gray_handle, invert, sigma, blurred)
+                blur_futures[future] = (bool(invert), float(sigma), blurred)
+
+        # split the thresholds, so all workers are busy
+        num_chunks = max(1, round(workers / len(blur_futures)))
+        threshold_futures = {}
+        for future in as_completed(blur_futures):
+            future.result()
+            candidate = blur_futures[future]
+            threshold_futures.update(evaluate(candidate, thresholds, num_chunks))
+            # freed when the thresholds are evaluated
+            registry.release(candidate[2])
+        collect(threshold_futures)
+
+        if refine and len(thresholds) > 1:
+            result, blurred = best
+            step = np.min(np.diff(np.sort(thresholds))) / 10
+            fine = np.round(result["threshold"] + step * np.arange(-9, 10), 3)
+            fine = fine[(fine > 0) & (fine < 1)]
+            candidate = (result["invert_image"], result["blur"], blurred)
+            collect(evaluate(candidate, fine, workers))
+
+    return (
+        pd.DataFrame(results)
+        .sort_values(by=["score", "blur", "threshold"], kind="stable")
+        .drop_duplicates(subset=["invert_image", "blur", "threshold"])
+        .reset_index(drop=True)
+    )
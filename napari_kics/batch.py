@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""Run the karyotype pipeline on a directory of images.
+
+Every image is read and processed in a worker process, so no image data is
+passed between processes, and its outputs (equivalent to those of the saving
+widget) are written to a directory named after the image and its extension
+(`a.png` -> `a_png`). Finished images are recorded in a checkpoint
+(`manifest.json` in the output directory) together with a hash of their
+parameters and the files written, so an interrupted run resumes where it
+stopped.
+"""
+
+import logging
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+from skimage import io
+
+from . import pipeline
+from .analysis_plots import get_argument_parser as get_analysis_argument_parser
+from .analysis_plots import read_fasta_index, read_tsv_data
+from .utils.image_io import image_formats
+from .utils.manifest import Manifest, content_hash
+from .utils.table_export import table_formats
+
+log = logging.getLogger(__name__)
+
+image_extensions = (".jpg", ".jpeg", ".png", ".tif", ".tiff", ".bmp")
+
+
+def find_images(input_dir):
+    return sorted(
+        fname
+        for fname in os.listdir(input_dir)
+        if fname.lower().endswith(image_extensions)
+        and os.path.isfile(os.path.join(input_dir, fname))
+    )
+
+
+def read_params(params_file):
+    """Read per-file parameters from a CSV file with a `file` column and any of
+    the columns of `pipeline.default_params`."""
+    table = pd.read_csv(params_file)
+    unknown = set(table.columns) - {"file", *pipeline.default_params}
+    if "file" not in table.columns or len(unknown) > 0:
+        raise ValueError(
+            f"{params_file}: expected a `file` column and any of "
+            f"{', '.join(pipeline.default_params)} (unknown: {', '.join(unknown)})"
+        )
+
+    return {
+        row.pop("file"): {
+            key: _parse_param(key, value)
+            for key, value in row.items()
+            if not pd.isna(value)
+        }
+        for row in table.to_dict(orient="records")
+    }
+
+
+def _parse_param(key, value):
+    default = pipeline.default_params[key]
+    if not isinstance(default, bool):
+        return type(default)(value)
+
+    # bool("False") is True
+    normalized = str(value).strip().lower()
+    if normalized in ("true", "1", "1.0", "yes"):
+        return True
+    elif normalized in ("false", "0", "0.0", "no"):
+        return False
+    else:
+        raise ValueError(f"{key}: expected true/false, 1/0 or yes/no, got {value!r}")
+
+
+def process_image(input_fname, output_dir, params, options):
+    """Run the pipeline on `input_fname` and write its outputs to `output_dir`.
+
+    Returns the number of labels and the names of the files written.
+    """
+    image = io.imread(input_fname)
+    result = pipeline.run(
+        image,
+        params,
+        scaffold_sizes=options["scaffold_sizes"],
+        ploidy=options["ploidy"],
+        **options["match_kwargs"],
+    )
+    files = pipeline.save_results(
+        output_dir,
+        image,
+        result,
+        image_format=options["image_format"],
+        table_format=options["table_format"],
+        labels_color=pipeline.labels_to_rgba(result["labels"]),
+    )
+
+    return len(result["table"]), files
+
+
+def run_batch(
+    input_dir,
+    output_dir,
+    *,
+    params=None,
+    file_params=None,
+    jobs=None,
+    force=False,
+    **options,
+):
+    """Process all images of `input_dir` with `params`, overridden per file by
+    `file_params`, in a pool of `jobs` processes.
+
+    Returns the names of the images that failed.
+    """
+    options = {
+        "scaffold_sizes": None,
+        "ploidy": None,
+        "match_kwargs": {},
+        "image_format": "png",
+        "table_format": "parquet",
+        **options,
+    }
+    os.makedirs(output_dir, exist_ok=True)
+    checkpoint = Manifest(output_dir)
+
+    pending = {}
+    for fname in find_images(input_dir):
+        image_params = {
+            **pipeline.default_params,
+            **(params or {}),
+            **(file_params or {}).get(fname, {}),
+        }
+        input_fname = os.path.join(input_dir, fname)
+        stat = os.stat(input_fname)
+        inputs_hash = content_hash(
+            image_params, options, stat.st_size, stat.st_mtime_ns
+        )
+        if not force and checkpoint.is_current(fname, inputs_hash):
+            log.info(f"skipping {fname}: up-to-date")
+            continue
+        pending[fname] = (input_fname, image_params, inputs_hash)
+
+    failed = []
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = {
+            executor.submit(
+                process_image,
+                input_fname,
+                os.path.join(output_dir, _output_name(fname)),
+                image_params,
+                options,
+            ): fname
+            for fname, (input_fname, image_params, _) in pending.items()
+        }
+
+        for i, future in enumerate(as_completed(futures), 1):
+            fname = futures[future]
+            try:
+                num_labels, files = future.result()
+            except Exception as e:
+                log.error(f"[{i}/{len(futures)}] {fname} failed: {e}")
+                failed.append(fname)
+            else:
+                log.info(f"[{i}/{len(futures)}] {fname}: {num_labels} labels")
+                checkpoint.update(
+                    fname,
+                    pending[fname][2],
+                    [os.path.join(_output_name(fname), f) for f in files],
+                )
+                # checkpoint each finished image, so an interrupted run resumes
+                checkpoint.save()
+
+    return failed
+
+
+def _output_name(fname):
+    # keep the extension, so `a.png` and `a.tif` get different directories
+    stem, extension = os.path.splitext(fname)
+    return f"{stem}_{extension[1:]}"
+
+
+def get_argument_parser():
+    import argparse
+
+    analysis_parser = get_analysis_argument_parser()
+
+    parser = argparse.ArgumentParser(
+        prog=os.path.basename(sys.argv[0]),
+        description=(
+            "Estimate chromosome sizes for every karyotype image in a directory."
+        ),
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument("input_dir", help="Directory of karyotype images")
+    parser.add_argument("output_dir", help="Directory of the results")
+    parser.add_argument(
+        "--invert",
+        action="store_true",
+        help="Invert the images",
+    )
+    parser.add_argument(
+        "--threshold",
+        "-t",
+        type=float,
+        default=float(os.environ.get("kt_threshold", 0.5)),
+        help="Threshold of the segmentation",
+    )
+    parser.add_argument(
+        "--blur",
+        "-b",
+        type=float,
+        default=float(os.environ.get("kt_blur", 0.5)),
+        help="Sigma of the Gaussian blur",
+    )
+    parser.add_argument(
+        "--genome-size",
+        "-g",
+        type=int,
+        default=int(os.environ.get("kt_genome_size", 0)),
+        help="Genome size in Mb (0: estimate relative sizes)",
+    )
+    parser.add_argument(
+        "--params",
+        metavar="CSV",
+        help=(
+            "Per-file parameters with a `file` column and any of the columns "
+            + ", ".join(pipeline.default_params)
+        ),
+    )
+    parser.add_argument(
+        "--ploidy",
+        type=int,
+        default=int(os.environ.get("kt_ploidy", 0)) or None,
+        help="Expected number of chromosomes per group",
+    )
+    parser.add_argument(
+        "--scaffold-sizes",
+        help="Match the estimates to scaffold sizes (one per line or FASTA-index)",
+    )
+    for dest in ("unmatched_penalty", "min_scaffold_size", "max_scaffolds"):
+        action = analysis_parser[dest]
+        parser.add_argument(
+            *action.option_strings[:1],
+            type=action.type,
+            default=action.default,
+            help=action.help,
+        )
+    parser.add_argument(
+        "--image-format",
+        choices=image_formats,
+        default=os.environ.get("kt_image_format", "png"),
+        help="Output format of the intermediate and label images",
+    )
+    parser.add_argument(
+        "--table-format",
+        choices=list(table_formats),
+        default=os.environ.get("kt_table_format", "parquet"),
+        help="Format of the columnar table (requires pyarrow)",
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=os.cpu_count(),
+        help="Number of worker processes",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Process all images, even those finished in an earlier run",
+    )
+
+    return parser
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    args = get_argument_parser().parse_args(sys.argv[1:])
+
+    scaffold_sizes = None
+    if args.scaffold_sizes is not None:
+        if args.scaffold_sizes.endswith(".fai"):
+            scaffold_sizes = read_fasta_index(args.scaffold_sizes)
+        else:
+            scaffold_sizes = read_tsv_data(args.scaffold_sizes, name="scaffold_sizes")
+
+    failed = run_batch(
+        args.input_dir,
+        args.output_dir,
+        params={
+            "invert_image": args.invert,
+            "threshold": args.threshold,
+            "blur": args.blur,
+            "genome_size": args.genome_size,
+        },
+        file_params=None if args.params is None else read_params(args.params),
+        jobs=args.jobs,
+        force=args.force,
+        scaffold_sizes=scaffold_sizes,
+        ploidy=args.ploidy,
+        match_kwargs={
+            "unmatched_penalty": args.unmatched_penalty,
+            "min_scaffold_size": args.min_scaffold_size,
+            "max_scaffolds": args.max_scaffolds,
+        },
+        image_format=args.image_format,
+        table_format=args.table_format,
+    )
+
+    if len(failed) > 0:
+        log.error(f"{len(failed)} image(s) failed: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,7 @@ import pandas as pd
 from qtpy import QtCore
 from qtpy.QtGui import QBrush, QColor
 
+from ..utils.estimates import chromosome_counts, chromosome_sizes, format_sizes
 from ..utils.guess_chromosome_labels import ChromosomeLabel
 
 
@@ -21,6 +22,12 @@ class EstimatesTableModel(QtCore.QAbstractTableModel):
         self.id2rgba = id2rgba
         self.dataframe = None
         self._genomeSize = 0
+        # changes collected while bulk changes are applied (see `BulkChanges`)
+        self._recordedChanges = None
+        # id -> row lookup (see `rowsForIds`)
+        self._rowIndex = None
+        # incremented on every change of the data or the row order
+        self.revision = 0
 
     def initData(
         self,
@@ -42,18 +49,90 @@ class EstimatesTableModel(QtCore.QAbstractTableModel):
                 else counts,
                 "area": areas,
                 # size will be computed from area by `update_size_column`
-                "size": np.zeros(n, dtype=np.float_),
+                "size": np.zeros(n, dtype=np.float64),
                 "_bbox": bboxes,
             },
             index=ids,
         )
         self._genomeSize = genomeSize
+        self._updateRowIndex()
         self._updateSizeColumn()
-        self.sigChange.emit("dataframe", None, None)
+        self._emitChange("dataframe", None, None)
 
     def hasData(self):
         return self.dataframe is not None
 
+    def rowsForIds(self, ids):
+        """Return the rows of the labels `ids` as array (-1 for unknown ids)."""
+        assert self.hasData()
+
+        ids = np.asarray(ids)
+        if isinstance(self._rowIndex, dict):
+            return np.fromiter(
+                (self._rowIndex.get(id, -1) for id in ids.tolist()),
+                dtype=np.intp,
+                count=ids.size,
+            ).reshape(ids.shape)
+
+        if not np.issubdtype(ids.dtype, np.integer):
+            ids = ids.astype(np.int_)
+        rows = np.full(ids.shape, -1, dtype=np.intp)
+        inside = (ids >= 0) & (ids < len(self._rowIndex))
+        rows[inside] = self._rowIndex[ids[inside]]
+
+        return rows
+
+    @staticmethod
+    def _isDenseIndex(min_id, max_id, num_ids):
+        return min_id >= 0 and max_id < max(4 * num_ids, 2**16)
+
+    def _updateRowIndex(self):
+        """Rebuild the id -> row lookup after rows were moved.
+
+        Ids are looked up in a dense array unless they are sparse, in which
+        case a dict is used. Inserted and removed rows update the lookup
+        incrementally (see `_insertRowIndex` and `_removeRowIndex`).
+        """
+        ids = self.dataframe.index.to_numpy()
+        dense = np.issubdtype(ids.dtype, np.integer) and (
+            len(ids) == 0 or self._isDenseIndex(ids.min(), ids.max(), len(ids))
+        )
+
+        if dense:
+            self._rowIndex = np.full(
+                ids.max() + 1 if len(ids) > 0 else 0, -1, dtype=np.intp
+            )
+            self._rowIndex[ids] = np.arange(len(ids))
+        else:
+            self._rowIndex = {id: row for row, id in enumerate(ids.tolist())}
+
+    def _insertRowIndex(self, id, row):
+        """Add `id` at `row` to the id -> row lookup."""
+        if isinstance(self._rowIndex, dict):
+            self._rowIndex[id] = row
+        elif not isinstance(id, (int, np.integer)) or not self._isDenseIndex(
+            id, id, len(self.dataframe)
+        ):
+            # the ids are no longer dense
+            self._updateRowIndex()
+        else:
+            if id >= len(self._rowIndex):
+                rowIndex = np.full(max(id + 1, 2 * len(self._rowIndex)), -1, np.intp)
+                rowIndex[: len(self._rowIndex)] = self._rowIndex
+                self._rowIndex = rowIndex
+            self._rowIndex[id] = row
+
+    def _removeRowIndex(self, id, row):
+        """Drop `id` from the id -> row lookup; the rows after `row` move up."""
+        moved = self.dataframe.index[row:]
+        if isinstance(self._rowIndex, dict):
+            del self._rowIndex[id]
+            for moved_row, moved_id in enumerate(moved.tolist(), row):
+                self._rowIndex[moved_id] = moved_row
+        else:
+            self._rowIndex[id] = -1
+            self._rowIndex[moved.to_numpy()] -= 1
+
     def hasGenomeSize(self):
         return self.genomeSize > 0
 
@@ -66,7 +145,7 @@ class EstimatesTableModel(QtCore.QAbstractTableModel):
         old_value = self._genomeSize
         self._genomeSize = value
         self._updateSizeColumn()
-        self.sigChange.emit("genomeSize", old_value, value)
+        self._emitChange("genomeSize", old_value, value)
 
     def rowCount(self, parent=None, *args, **kwargs):
         if self.hasData():
@@ -149,11 +228,58 @@ class EstimatesTableModel(QtCore.QAbstractTableModel):
                 self._updateSizeColumn()
             elif header == "label":
                 self._updateCountColumn()
-            self.sigChange.emit((row, column), old_value, new_value)
+            self._emitChange((self.dataframe.index[row], header), old_value, new_value)
             return True
         else:
             return False
 
+    def setColumn(self, column, ids, values):
+        """Set `column` to `values` for all rows named by `ids` at once.
+
+        The change is reported as a single bulk change listing every cell.
+        """
+        if not self.hasData() or len(ids) == 0:
+            return
+
+        rows = self.rowsForIds(ids)
+        if (rows < 0).any():
+            raise KeyError(f"unknown ids: {np.asarray(ids)[rows < 0]}")
+        col = self.columns.get_loc(column)
+
+        old_values = self.dataframe.iloc[rows, col].to_numpy()
+        new_values = pd.Series(
+            [self._convert(column, value) for value in values], dtype=object
+        ).to_numpy()
+        if self.dataframe.dtypes[column] != object:
+            # keep numeric columns numeric
+            new_values = new_values.astype(self.dataframe.dtypes[column])
+        self.dataframe.iloc[rows, col] = new_values
+
+        if column in ("area", "count"):
+            self._updateSizeColumn()
+        elif column == "label":
+            self._updateCountColumn()
+
+        self.revision += 1
+        changes = [
+            ((id, column), old_value, new_value)
+            for id, old_value, new_value in zip(ids, old_values, new_values)
+        ]
+        if self._recordedChanges is not None:
+            self._recordedChanges.extend(changes)
+        else:
+            self.sigChange.emit("bulk", None, changes)
+
+    def bboxes(self, rows=None):
+        """Return the bounding boxes of `rows` (default: all) as `(n, 4)` array."""
+        assert self.hasData()
+
+        bboxes = self.dataframe["_bbox"].to_numpy()
+        if rows is not None:
+            bboxes = bboxes[rows]
+
+        return np.array(bboxes.tolist(), dtype=np.int_).reshape(-1, 4)
+
     def _convert(self, column, value):
         assert self.hasData()
 
@@ -189,51 +315,65 @@ class EstimatesTableModel(QtCore.QAbstractTableModel):
             "_bbox": bbox,
         }
         self.endInsertRows()
+        self._insertRowIndex(id, new_pos)
         self._updateSizeColumn()
-        self.sigChange.emit("insertRow", None, self.dataframe.loc[id, :])
+        self._emitChange("insertRow", None, self.dataframe.loc[id, :])
 
     def removeRow(self, id):
-        rm_pos = self.dataframe.index.get_loc(id)
+        rm_pos = self.rowsForIds([id])[0]
+        if rm_pos < 0:
+            raise KeyError(id)
         deleted_row = self.dataframe.loc[id, :]
         self.beginRemoveRows(QtCore.QModelIndex(), rm_pos, rm_pos)
         self.dataframe.drop(id, inplace=True)
         self.endRemoveRows()
+        self._removeRowIndex(id, rm_pos)
         self._updateSizeColumn()
-        self.sigChange.emit("removeRow", deleted_row, None)
+        self._emitChange("removeRow", deleted_row, None)
+
+    def _emitChange(self, where, old, new):
+        """Emit `sigChange` or record the change if bulk changes are active.
+
+        `where` is either the name of the changed entity or a tuple
+        `(id, column)` naming a single cell.
+        """
+        self.revision += 1
+        if self._recordedChanges is not None:
+            self._recordedChanges.append((where, old, new))
+        else:
+            self.sigChange.emit(where, old, new)
+
+    def formatColumn(self, column, rows=None):
+        """Return display strings of `column` for `rows` (default: all rows).
+
+        This is the vectorized counterpart to calling `data` cell by cell.
+        """
+        assert self.hasData()
+
+        values = self.dataframe[column].to_numpy()
+        if rows is not None:
+            values = values[rows]
+
+        if column == "area":
+            return np.char.mod("%d", values.astype(np.int_))
+        elif column == "size":
+            return format_sizes(values, self.genomeSize)
+        else:
+            return np.array([str(value) for value in values], dtype=np.str_)
 
     def _updateSizeColumn(self):
         if not self.hasData():
             return
 
-        gs = self.genomeSize if self.hasGenomeSize() else 100
-        areas = self.dataframe["area"]
-        counts = self.dataframe["count"]
-        nonzero_mask = counts > 0
-        rho = gs / np.sum(areas[nonzero_mask] / counts[nonzero_mask])
-        sizes = np.zeros_like(areas, dtype=np.float_)
-        sizes[nonzero_mask] = rho * areas.loc[nonzero_mask]
-
-        self.dataframe["size"] = sizes
+        self.dataframe["size"] = chromosome_sizes(
+            self.dataframe["area"], self.dataframe["count"], self.genomeSize
+        )
 
     def _updateCountColumn(self):
         if not self.hasData():
             return
 
-        def get_key(label):
-            if isinstance(label, ChromosomeLabel):
-                return label.major
-            else:
-                return label
-
-        counts = dict()
-        for label in self.dataframe["label"]:
-            key = get_key(label)
-            count = counts.get(key, 0)
-            counts[key] = count + 1
-
-        for id, label in self.dataframe["label"].items():
-            key = get_key(label)
-            self.dataframe.at[id, "count"] = counts[key]
+        self.dataframe["count"] = chromosome_counts(self.dataframe["label"])
 
         self._updateSizeColumn()
 
@@ -270,6 +410,8 @@ class EstimatesTableModel(QtCore.QAbstractTableModel):
             key=key,
             inplace=True,
         )
+        self._updateRowIndex()
+        self.revision += 1
         self.layoutChanged.emit()
 
     class BulkChanges:
@@ -279,6 +421,8 @@ class EstimatesTableModel(QtCore.QAbstractTableModel):
 
         def __enter__(self):
             self.changes = list()
+            # collect direct changes to the model, too
+            self.model._recordedChanges = list()
 
             return self
 
@@ -286,13 +430,19 @@ class EstimatesTableModel(QtCore.QAbstractTableModel):
             # block signals until the end of the method
             blocker = QtCore.QSignalBlocker(self.model)
 
-            for change in self.changes:
-                method = getattr(self.model, change["method"])
-                del change["method"]
-                method(**change)
-
-            blocker.unblock()
-            self.model.sigChange.emit("bulk", None, None)
+            try:
+                for change in self.changes:
+                    method = getattr(self.model, change["method"])
+                    del change["method"]
+                    method(**change)
+            finally:
+                recordedChanges = self.model._recordedChanges
+                self.model._recordedChanges = None
+                blocker.unblock()
+
+            # the payload lists the individual changes as `(where, old, new)`
+            if recordedChanges:
+                self.model.sigChange.emit("bulk", None, recordedChanges)
 
         def setData(
             self, index=None, value=None, role=QtCore.Qt.EditRole, row=None, column=None
@@ -0,0 +1,363 @@
+"""Headless stages of the karyotype workflow.
+
+Every stage is a function over arrays and tables, so the workflow
+
+    invert -> blur -> threshold -> label -> table -> guess order -> annotate
+    -> match -> save
+
+runs in scripts and batch jobs without a viewer. Tables are `DataFrame`s
+indexed by label id with the columns `label`, `count`, `area`, `size` and
+`_bbox` (the columns of `EstimatesTableModel` without the color). The
+widgets are front-ends over these functions.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+from scipy import ndimage
+from skimage import io
+
+from .analysis_plots import matching_dataframe, prepare_matching
+from .preprocessing import apply_blur, apply_invert, apply_threshold, label, to_gray
+from .utils import map_label_colors
+from .utils.estimates import chromosome_counts, chromosome_sizes, format_sizes
+from .utils.export_annotated_karyotype import export_svg, linked_image_name
+from .utils.guess_chromosome_labels import ChromosomeLabel, guess_chromosome_labels
+from .utils.image_io import minimal_label_dtype, to_ubyte, write_tiff, write_zarr
+from .utils.label_colors import label_colors
+from .utils.render_annotated_karyotype import export_png
+from .utils.table_export import export_table, has_pyarrow, table_columns, table_formats
+
+# names of the intermediate images in the order they are computed
+image_names = ("inverted", "blurred", "thresholded")
+
+# default run parameters (as saved in `params.csv`)
+default_params = {
+    "invert_image": False,
+    "threshold": 0.5,
+    "blur": 0.5,
+    "genome_size": 0,
+}
+
+
+def preprocess(image, *, invert_image, sigma, threshold):
+    """Return the intermediate images (see `image_names`) of `image`."""
+    inverted = apply_invert(to_gray(image), invert_image)
+    blurred = apply_blur(inverted, sigma)
+
+    return {
+        "inverted": inverted,
+        "blurred": blurred,
+        "thresholded": apply_threshold(blurred, threshold),
+    }
+
+
+def labels_to_rgba(labels, *, num_colors=50, seed=0.5):
+    """Return the RGBA colors (uint8) of `labels` as shown by a napari label
+    layer with the default colormap (`num_colors` and `seed`)."""
+    return map_label_colors(
+        labels, lambda ids: label_colors(ids, num_colors=num_colors, seed=seed)
+    )
+
+
+def label_statistics(labels):
+    """Return the ids, areas and bounding boxes (`(n, 4)`, like `regionprops`)
+    of all labels except the background."""
+    areas = np.bincount(labels.ravel())
+    ids = np.flatnonzero(areas)
+    ids = ids[ids != 0]
+    objects = ndimage.find_objects(labels)
+    bboxes = np.array(
+        [
+            (rows.start, cols.start, rows.stop, cols.stop)
+            for rows, cols in (objects[id - 1] for id in ids.tolist())
+        ],
+        dtype=np.int_,
+    ).reshape(-1, 4)
+
+    return ids, areas[ids].astype(np.float64), bboxes
+
+
+def estimates_table(ids, labels, areas, bboxes, counts=None, genome_size=0):
+    """Return the table of the labels `ids` with their sizes."""
+    n = len(ids)
+    counts = np.ones(n, dtype=np.int_) if counts is None else np.asarray(counts)
+
+    return pd.DataFrame(
+        {
+            "label": list(labels),
+            "count": counts,
+            "area": np.asarray(areas, dtype=np.float64),
+            "size": chromosome_sizes(areas, counts, genome_size)
+            if n > 0
+            else np.zeros(0),
+            "_bbox": [tuple(bbox) for bbox in np.asarray(bboxes).tolist()],
+        },
+        index=ids,
+    )
+
+
+def table_from_labels(labels, genome_size=0):
+    """Return the table of all labels of the label image `labels` sorted by
+    descending area."""
+    ids, areas, bboxes = label_statistics(labels)
+    table = estimates_table(
+        ids, [str(id) for id in ids], areas, bboxes, genome_size=genome_size
+    )
+
+    return table.sort_values(by="area", ascending=False, kind="stable")
+
+
+def guess_order(table, genome_size=0, *, ploidy=None):
+    """Return `table` labelled with the guessed chromosome labels (see
+    `guess_chromosome_labels`) and sorted by label."""
+    labels = guess_chromosome_labels(
+        np.array(table["_bbox"].to_list(), dtype=np.int_).reshape(-1, 4),
+        ploidy=ploidy,
+        areas=table["area"].to_numpy(),
+    )
+    table = table.copy()
+    table["label"] = pd.Series(labels, index=table.index, dtype=object)
+    table["count"] = chromosome_counts(labels)
+    if len(table) > 0:
+        table["size"] = chromosome_sizes(table["area"], table["count"], genome_size)
+
+    return table.sort_values(by="label", key=lambda col: col.astype(str))
+
+
+def annotations(table, genome_size=0):
+    """Return the annotations of `table` as accepted by `export_svg` and
+    `export_png`."""
+    return {
+        "tags": [str(label) for label in table["label"]],
+        "sizes": format_sizes(table["size"], genome_size).tolist(),
+        "bboxes": table["_bbox"].to_list(),
+    }
+
+
+def chromosome_estimates(table, scaffold_sizes, genome_size=0):
+    """Return the mean size estimate (in bases) per chromosome of `table`."""
+    keys = [
+        str(label.major) if isinstance(label, ChromosomeLabel) else label
+        for label in table["label"]
+    ]
+    estimates = (
+        pd.Series(table["size"].to_numpy(), index=keys)
+        .groupby(level=0, sort=False)
+        .mean()
+        .rename("chromosome_estimates")
+    )
+
+    if genome_size > 0:
+        # sizes are in mega bases
+        return estimates * 1_000_000
+    else:
+        # sizes are in percent
+        return estimates * sum(scaffold_sizes) / 100
+
+
+def match(estimates, scaffold_sizes, **kwargs):
+    """Return the optimal matching of the chromosome `estimates` to the
+    `scaffold_sizes` (see `analysis_plots.prepare_matching` for `kwargs`)."""
+    return matching_dataframe(*prepare_matching(scaffold_sizes, estimates, **kwargs))
+
+
+def run(image, params=None, *, scaffold_sizes=None, ploidy=None, **match_kwargs):
+    """Run all stages on `image` with `params` (see `default_params`).
+
+    Returns a dict of the intermediate images, the `labels`, the `table` and
+    the `matching` (if `scaffold_sizes` are given).
+    """
+    params = {**default_params, **(params or {})}
+
+    result = preprocess(
+        image,
+        invert_image=params["invert_image"],
+        sigma=params["blur"],
+        threshold=params["threshold"],
+    )
+    result["params"] = params
+    result["labels"] = label(result["thresholded"])
+    result["table"] = guess_order(
+        table_from_labels(result["labels"], params["genome_size"]),
+        params["genome_size"],
+        ploidy=ploidy,
+    )
+    result["matching"] = None
+    if scaffold_sizes is not None:
+        result["matching"] = match(
+            chromosome_estimates(
+                result["table"], scaffold_sizes, params["genome_size"]
+            ),
+            scaffold_sizes,
+            **match_kwargs,
+        )
+
+    return result
+
+
+def save_images(path, images, *, image_format="png", labels_color=None):
+    """Write the intermediate `images` and the label image (`"labelled"`) as
+    `image_format` and `labels_color` (RGB(A)) as `labelled_color.png`.
+
+    "png" writes the intermediate images as 8-bit PNGs and the labels as
+    TIFF. "tiff" and "zarr" write compressed, tiled (chunked) images with
+    the thresholded mask bit-packed and the labels in their smallest dtype,
+    either as one TIFF per image or as arrays of `images.zarr`.
+
+    Returns the names of the files written.
+    """
+    for name, img in images.items():
+        # lazily loaded (e.g. restored) images are read here
+        img = np.asarray(img)
+        if name == "labelled":
+            if image_format == "png":
+                # exact labels
+                io.imsave(f"{path}/{name}.tiff", img, check_contrast=False)
+                continue
+            img = img.astype(minimal_label_dtype(img))
+        elif name == "thresholded" and image_format != "png":
+            img = img.astype(bool)
+        else:
+            img = to_ubyte(img.astype(bool) if name == "thresholded" else img)
+
+        if image_format == "zarr":
+            write_zarr(f"{path}/images.zarr", name, img)
+        elif image_format == "tiff":
+            write_tiff(f"{path}/{name}.tiff", img)
+        else:
+            io.imsave(f"{path}/{name}.png", img, check_contrast=False)
+
+    files = image_files(list(images), image_format)
+    if labels_color is not None:
+        io.imsave(f"{path}/labelled_color.png", labels_color)
+        files.append("labelled_color.png")
+
+    return files
+
+
+def image_files(names, image_format="png"):
+    """Return the files written by `save_images` for the images `names`."""
+    if image_format == "zarr":
+        files = ["images.zarr"] if names else []
+    elif image_format == "tiff":
+        files = [f"{name}.tiff" for name in names]
+    else:
+        files = [
+            f"{name}.tiff" if name == "labelled" else f"{name}.png" for name in names
+        ]
+
+    return files
+
+
+def save_params(path, params):
+    pd.Series(params).to_csv(f"{path}/params.csv", header=False)
+
+    return ["params.csv"]
+
+
+def save_table(path, table):
+    data = pd.DataFrame()
+    data["tag"] = table["label"].to_list()
+    data["label"] = table.index.to_list()
+    data["area"] = table["area"].to_list()
+    data["size"] = table["size"].to_list()
+
+    data.to_csv(f"{path}/data.csv", index=False)
+
+    return ["data.csv"]
+
+
+def save_table_columnar(path, table, params, table_format="parquet"):
+    fname = f"data{table_formats[table_format]}"
+    export_table(
+        f"{path}/{fname}",
+        table_columns(
+            ids=table.index.to_numpy(),
+            labels=table["label"],
+            counts=table["count"].to_numpy(),
+            areas=table["area"].to_numpy(),
+            sizes=table["size"].to_numpy(),
+            bboxes=np.array(table["_bbox"].to_list(), dtype=np.int_).reshape(-1, 4),
+        ),
+        metadata=params,
+        table_format=table_format,
+    )
+
+    return [fname]
+
+
+def save_matching(path, matching):
+    matching.to_csv(f"{path}/matching.csv", index=False)
+
+    return ["matching.csv"]
+
+
+def annotated_karyotype_files(*, external_image=False, image_format="png", **_):
+    """Return the files written by `save_annotated_karyotype` with the same
+    `svg_options`."""
+    files = ["annotated.svg"]
+    if external_image:
+        files.append(linked_image_name(files[0], image_format))
+
+    return files
+
+
+def save_annotated_karyotype(path, karyotype, table, genome_size=0, **svg_options):
+    files = export_svg(
+        f"{path}/annotated.svg",
+        karyotype=karyotype,
+        **annotations(table, genome_size),
+        **svg_options,
+    )
+
+    return [os.path.basename(fname) for fname in files]
+
+
+def save_annotated_png(path, karyotype, table, genome_size=0):
+    export_png(
+        f"{path}/annotated.png", karyotype=karyotype, **annotations(table, genome_size)
+    )
+
+    return ["annotated.png"]
+
+
+def save_results(
+    path,
+    image,
+    result,
+    *,
+    image_format="png",
+    table_format="parquet",
+    labels_color=None,
+    svg_options=None,
+):
+    """Write the artifacts of the saving widget for the `result` of `run`.
+
+    Returns the names of the files written.
+    """
+    os.makedirs(path, exist_ok=True)
+    params = result["params"]
+    table = result["table"]
+
+    files = save_images(
+        path,
+        {
+            **{name: result[name] for name in image_names},
+            "labelled": result["labels"],
+        },
+        image_format=image_format,
+        labels_color=labels_color,
+    )
+    files += save_params(path, params)
+    files += save_table(path, table)
+    if has_pyarrow():
+        files += save_table_columnar(path, table, params, table_format)
+    if result.get("matching") is not None:
+        files += save_matching(path, result["matching"])
+    files += save_annotated_karyotype(
+        path, image, table, params["genome_size"], **(svg_options or {})
+    )
+    files += save_annotated_png(path, image, table, params["genome_size"])
+
+    return files
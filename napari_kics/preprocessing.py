@@ -0,0 +1,49 @@
+"""Image stages of the pipeline (see `pipeline`).
+
+They only depend on NumPy, SciPy and scikit-image, so worker processes (see
+`autotune`) import them quickly.
+"""
+import numpy as np
+from scipy import ndimage
+from skimage.color import rgb2gray, rgba2rgb
+from skimage.filters import gaussian
+
+
+def to_gray(img):
+    """Convert an RGB(A) or gray image to a float gray image in [0, 1]."""
+    img = np.asarray(img)
+    if len(img.shape) == 3 and img.shape[-1] == 4:
+        return rgb2gray(rgba2rgb(img))
+    elif len(img.shape) == 3 and img.shape[-1] == 3:
+        return rgb2gray(img)
+    elif (
+        (len(img.shape) == 3 and img.shape[-1] == 1) or (len(img.shape) == 2)
+    ) and img.dtype.kind in "uif":
+        if img.dtype.kind in "ui":
+            return img / 255.0
+        elif img.dtype.kind == "f":
+            return img
+        else:
+            assert False, "unreachable"
+    else:
+        raise Exception(
+            f"Cannot process image with type {img.dtype} and shape {img.shape}."
+        )
+
+
+def apply_invert(image, invert_image):
+    return 1 - image if invert_image else image
+
+
+def apply_blur(image, sigma):
+    return gaussian(image, sigma)
+
+
+def apply_threshold(image, threshold):
+    """Return the mask (0/1) of the pixels darker than `1 - threshold`."""
+    return (image < 1 - threshold).astype(int)
+
+
+def label(thresholded):
+    """Assign a unique id to every connected component of `thresholded`."""
+    return ndimage.label(thresholded)[0]
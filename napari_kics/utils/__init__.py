@@ -1,7 +1,19 @@
 import numpy as np
+from skimage import img_as_ubyte
 
+from .edit_journal import (
+    EditJournal,
+    JournalReader,
+    LabelEdit,
+    OrderAction,
+    run_length_decode,
+    run_length_encode,
+)
+from .event_coalescer import *
 from .guess_chromosome_labels import *
 from .label_history_processor import *
+from .label_occupancy import *
+from .lookup_array import *
 
 
 def get_img(name, viewer):
@@ -29,6 +41,90 @@ def bbox2shape(bbox):
     )
 
 
+def bboxes2shapes(bboxes):
+    """Vectorized `bbox2shape` turning `(n, 4)` bboxes into `(n, 4, 2)` vertices."""
+    bboxes = np.asarray(bboxes).reshape(-1, 4)
+
+    return bboxes[:, [[0, 1], [2, 1], [2, 3], [0, 3]]]
+
+
+def labels_on_line(labels, from_pos, to_pos):
+    """Return the distinct non-zero labels crossed by the line segment from
+    `from_pos` to `to_pos` (inclusive) in the order they are crossed."""
+    from skimage.draw import line
+
+    r0, c0 = np.asarray(from_pos, dtype=np.int_)[-2:]
+    r1, c1 = np.asarray(to_pos, dtype=np.int_)[-2:]
+    rr, cc = line(r0, c0, r1, c1)
+
+    inside = (rr >= 0) & (rr < labels.shape[0]) & (cc >= 0) & (cc < labels.shape[1])
+    crossed = labels[rr[inside], cc[inside]]
+    crossed = crossed[crossed != 0]
+
+    _, first = np.unique(crossed, return_index=True)
+
+    return crossed[np.sort(first)]
+
+
+def remap_labels(labels, old_labels, new_labels):
+    """Find the pixels of `labels` changed by mapping `old_labels` to `new_labels`.
+
+    `new_labels` is broadcast against `old_labels`, so a single new label
+    merges (or, with 0, deletes) all old labels at once. Returns the mask of
+    changed pixels and their new labels in C order.
+
+    The image is traversed once through a dense lookup table indexed by label
+    id, independent of the number of remapped labels. For sparse, very large
+    ids, sorted ids are matched with `np.isin` and `np.searchsorted` instead.
+    """
+    old_labels = np.atleast_1d(np.asarray(old_labels))
+    new_labels = np.broadcast_to(np.asarray(new_labels), old_labels.shape)
+
+    # later assignments win, as they would when remapping sequentially
+    old_labels, last = np.unique(old_labels[::-1], return_index=True)
+    new_labels = new_labels[::-1][last]
+    changed = old_labels != new_labels
+    old_labels, new_labels = old_labels[changed], new_labels[changed]
+
+    if len(old_labels) == 0:
+        return np.zeros(labels.shape, dtype=np.bool_), new_labels
+
+    max_label = max(labels.max(initial=0), old_labels.max())
+    if max_label <= max(labels.size, 2**16):
+        is_remapped = np.zeros(max_label + 1, dtype=np.bool_)
+        is_remapped[old_labels] = True
+        lut = np.arange(max_label + 1, dtype=labels.dtype)
+        lut[old_labels] = new_labels
+
+        where = is_remapped[labels]
+        values = lut[labels[where]]
+    else:
+        where = np.isin(labels, old_labels)
+        values = new_labels[np.searchsorted(old_labels, labels[where])]
+        values = values.astype(labels.dtype)
+
+    return where, values
+
+
+def relabel(label_layer, old_labels, new_labels):
+    """Map `old_labels` to `new_labels` in `label_layer` in a single pass.
+
+    The change is recorded as a single step in the layer's `EditJournal`
+    (see `remap_labels` for the semantics of the mapping).
+    """
+    labels = label_layer.data
+    where, values = remap_labels(labels, old_labels, new_labels)
+
+    if not where.any():
+        return
+
+    # the history stores only the footprint and the replaced labels
+    edit = LabelEdit.from_mask(labels, where, values)
+    labels[where] = values
+    EditJournal.attach(label_layer).record(edit)
+    label_layer.refresh()
+
+
 def replace_label(label_layer, old_label, new_label):
     """Replace all occurrences of `old_label` in `label_layer` by `new_label`.
 
@@ -38,24 +134,42 @@ def replace_label(label_layer, old_label, new_label):
     If `old_label` is iterable, all the named labels will be efficiently
     replaced in a single history step.
     """
-    labels = label_layer.data
-    where = None
-    try:
-        for label in old_label:
-            if where is None:
-                where = labels == label
-            else:
-                where |= labels == label
-    except TypeError:
-        where = labels == old_label
-
-    where_indices = np.nonzero(where)
-    label_layer._save_history(
-        (
-            where_indices,
-            np.array(labels[where_indices], copy=True),
-            new_label,
-        )
+    relabel(label_layer, old_label, new_label)
+
+
+def colorize_labels(label_layer, labels=None):
+    """Return the RGBA colors (uint8) of `labels` (default: the layer data) as
+    shown by `label_layer`."""
+    labels = np.asarray(label_layer.data if labels is None else labels)
+
+    # map the ids like a (1, n) label image, so colors match the layer exactly
+    return map_label_colors(
+        labels, lambda ids: label_layer.get_color(list(ids[None, :]))[0]
     )
-    labels[where_indices] = new_label
-    label_layer.refresh()
+
+
+def map_label_colors(labels, colors):
+    """Return the RGBA colors (uint8) of `labels` where `colors(ids)` returns
+    the (float) colors of the label `ids`.
+
+    The colors are looked up once per present label id and then gathered for
+    all pixels, instead of mapping every pixel through the colormap.
+    """
+    labels = np.asarray(labels)
+
+    max_label = int(labels.max(initial=0))
+    if max_label <= max(labels.size, 2**16):
+        ids = np.flatnonzero(np.bincount(labels.ravel(), minlength=1))
+        index = None
+    else:
+        ids, index = np.unique(labels, return_inverse=True)
+        index = index.reshape(labels.shape)
+
+    colors = img_as_ubyte(colors(ids))
+
+    if index is None:
+        lut = np.zeros((max_label + 1, colors.shape[-1]), dtype=np.uint8)
+        lut[ids] = colors
+        return lut[labels]
+    else:
+        return colors[index]
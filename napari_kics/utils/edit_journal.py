@@ -0,0 +1,397 @@
+import weakref
+
+import numpy as np
+
+
+def run_length_encode(values):
+    """Encode a 1D array as run values and run lengths."""
+    values = np.asarray(values)
+    if len(values) == 0:
+        return values[:0], np.zeros(0, dtype=np.uint32)
+
+    starts = np.flatnonzero(np.r_[True, values[1:] != values[:-1]])
+    lengths = np.diff(np.r_[starts, len(values)]).astype(np.uint32)
+
+    return values[starts], lengths
+
+
+def run_length_decode(run_values, run_lengths):
+    """Inverse of `run_length_encode`."""
+    return np.repeat(run_values, run_lengths)
+
+
+class LabelEdit:
+    """Compact record of an edit of a label image.
+
+    The changed pixels are stored as runs of consecutive flat (C-order)
+    indices, or as a bitmask if that is smaller (see `from_mask`), together
+    with run-length-encoded label values before and after the edit. Pixels
+    whose value did not change are dropped.
+    """
+
+    __slots__ = (
+        "shape",
+        "run_starts",
+        "run_lengths",
+        "bitmask",
+        "old_runs",
+        "old_run_lengths",
+        "new_runs",
+        "new_run_lengths",
+    )
+
+    def __init__(self, shape, flat_indices, old_values, new_values):
+        flat_indices = np.asarray(flat_indices, dtype=np.intp)
+        old_values = np.asarray(old_values)
+        new_values = np.broadcast_to(new_values, flat_indices.shape)
+
+        changed = old_values != new_values
+        order = np.argsort(flat_indices[changed], kind="stable")
+        flat_indices = flat_indices[changed][order]
+        old_values = old_values[changed][order]
+        new_values = new_values[changed][order]
+
+        self.shape = tuple(shape)
+        run_starts = np.flatnonzero(np.r_[True, np.diff(flat_indices) != 1])
+        self.run_starts = flat_indices[run_starts]
+        self.run_lengths = np.diff(np.r_[run_starts, len(flat_indices)]).astype(
+            np.uint32
+        )
+        self.bitmask = None
+        self.old_runs, self.old_run_lengths = run_length_encode(old_values)
+        self.new_runs, self.new_run_lengths = run_length_encode(new_values)
+
+    @classmethod
+    def from_mask(cls, labels, mask, new_values):
+        """Create from replacing the pixels of `labels` in `mask` by `new_values`.
+
+        `new_values` is either a single label or the new labels of the masked
+        pixels in C order. Neither coordinate nor index arrays of the footprint
+        are materialised; `mask` must not contain unchanged pixels.
+        """
+        flat_mask = np.ravel(mask).view(np.int8)
+        edges = np.flatnonzero(np.diff(flat_mask, prepend=0, append=0))
+        old_values = np.ravel(labels)[flat_mask.view(np.bool_)]
+
+        edit = cls.__new__(cls)
+        edit.shape = tuple(labels.shape)
+        if len(edges) // 2 * 12 < len(flat_mask) // 8:
+            edit.run_starts = edges[0::2]
+            edit.run_lengths = (edges[1::2] - edges[0::2]).astype(np.uint32)
+            edit.bitmask = None
+        else:
+            # fragmented footprint, e.g. many small objects
+            edit.run_starts = np.zeros(0, dtype=np.intp)
+            edit.run_lengths = np.zeros(0, dtype=np.uint32)
+            edit.bitmask = np.packbits(flat_mask.view(np.bool_))
+        edit.old_runs, edit.old_run_lengths = run_length_encode(old_values)
+        if np.ndim(new_values) == 0:
+            edit.new_runs = np.array([new_values], dtype=old_values.dtype)
+            edit.new_run_lengths = np.array([len(old_values)], dtype=np.uint32)
+        else:
+            edit.new_runs, edit.new_run_lengths = run_length_encode(new_values)
+
+        return edit
+
+    @classmethod
+    def from_history_atom(cls, shape, atom):
+        """Create from a napari history atom `(indices, old_values, new_values)`."""
+        indices, old_values, new_values = atom
+        flat_indices = np.ravel_multi_index(indices, shape)
+
+        return cls(shape, flat_indices, old_values, new_values)
+
+    def __len__(self):
+        return int(self.old_run_lengths.sum())
+
+    @property
+    def nbytes(self):
+        return sum(
+            getattr(self, slot).nbytes
+            for slot in self.__slots__[1:]
+            if getattr(self, slot) is not None
+        )
+
+    def flat_indices(self):
+        if self.bitmask is not None:
+            return np.flatnonzero(
+                np.unpackbits(self.bitmask, count=int(np.prod(self.shape)))
+            )
+
+        lengths = self.run_lengths.astype(np.intp)
+        offsets = self.run_starts - np.cumsum(np.r_[0, lengths[:-1]])
+
+        return np.arange(len(self)) + np.repeat(offsets, lengths)
+
+    def old_values(self):
+        return run_length_decode(self.old_runs, self.old_run_lengths)
+
+    def new_values(self):
+        return run_length_decode(self.new_runs, self.new_run_lengths)
+
+    def values(self, direction=+1):
+        """Return the pixel values before and after applying in `direction`."""
+        if direction > 0:
+            return self.old_values(), self.new_values()
+        else:
+            return self.new_values(), self.old_values()
+
+    def apply(self, labels, direction=+1):
+        np.put(labels, self.flat_indices(), self.values(direction)[1])
+
+    def __repr__(self):
+        if self.bitmask is not None:
+            return f"LabelEdit(<{len(self)} pixels in a bitmask>)"
+        return f"LabelEdit(<{len(self)} pixels in {len(self.run_starts)} runs>)"
+
+
+class OrderAction:
+    """Record of `labels` being appended to the ordering group `group`."""
+
+    __slots__ = ("labels", "group")
+
+    def __init__(self, labels, group):
+        self.labels = np.atleast_1d(labels)
+        self.group = group
+
+    @property
+    def nbytes(self):
+        return self.labels.nbytes
+
+    def apply(self, labels, direction=+1):
+        # ordering does not touch the label image
+        pass
+
+    def __repr__(self):
+        return f"OrderAction(labels={self.labels.tolist()}, group={self.group})"
+
+
+class EditJournal:
+    """Plugin-owned journal of label edits and ordering actions.
+
+    Records are grouped into undoable steps. Every record that is applied,
+    undone or redone is appended to an event log as `(record, direction)`
+    which readers (see `subscribe`) consume incrementally; the log is trimmed
+    to the events not yet seen by all readers.
+
+    If attached to a napari labels layer (see `attach`), the journal records
+    the layer's paint and fill operations from its public `paint` event, one
+    step per stroke, and replaces the layer's own undo history: `layer.undo`
+    and `layer.redo` undo and redo journal steps. Replacing the layer data
+    resets the journal.
+
+    If `max_bytes` is given, the oldest steps are forgotten once the recorded
+    steps take more memory; the most recent step is always kept.
+
+    `revision` counts the records applied, undone or redone; together with
+    `generation` it identifies the state of the journaled labels.
+    """
+
+    metadata_key = "edit_journal"
+
+    def __init__(self, *, max_bytes=None):
+        self.max_bytes = max_bytes
+        self.layer = None
+        self.labels = None
+        self.generation = 0
+        self.revision = 0
+        self._readers = weakref.WeakSet()
+        self._log = []
+        self._log_offset = 0
+        self.clear()
+
+    @classmethod
+    def attach(cls, layer, **kwargs):
+        """Return the journal of labels `layer`, creating it if necessary.
+
+        `kwargs` are passed on to the constructor of a new journal.
+        """
+        journal = layer.metadata.get(cls.metadata_key)
+        if journal is not None:
+            return journal
+
+        if not hasattr(layer.events, "paint"):
+            from napari import __version__ as napari_version
+
+            raise RuntimeError(
+                "recording label edits requires the `paint` event of labels "
+                f"layers, which napari {napari_version} does not provide"
+            )
+
+        journal = cls(**kwargs)
+        journal.layer = layer
+        journal.labels = layer.data
+        layer.metadata[cls.metadata_key] = journal
+
+        # every paint stroke, fill and `data_setitem` call is reported as one
+        # history item of `(indices, old_values, new_values)` atoms
+        layer.events.paint.connect(journal._record_history_item)
+        # the journal replaces napari's history: napari keeps no items of its
+        # own (they hold full coordinate arrays) and undo and redo of the layer
+        # (also bound to Control-Z and Control-Shift-Z) go through the journal
+        layer._history_limit = 0
+        layer._reset_history()
+        layer.undo = journal.undo
+        layer.redo = journal.redo
+
+        return journal
+
+    def clear(self):
+        """Forget all steps; readers skip everything logged so far."""
+        self.steps = []
+        self.position = 0
+        self._nbytes = 0
+        self._step_open = False
+        self._step_is_current = False
+        self._log_offset += len(self._log)
+        self._log = []
+        self.generation += 1
+
+    def _check_data(self):
+        if self.layer is not None and self.labels is not self.layer.data:
+            # the layer data was replaced; recorded edits are meaningless now
+            self.labels = self.layer.data
+            self.clear()
+
+    @property
+    def nbytes(self):
+        return self._nbytes
+
+    def can_undo(self):
+        return self.position > 0
+
+    def can_redo(self):
+        return self.position < len(self.steps)
+
+    def begin_step(self):
+        """Collect the following records into a single undoable step."""
+        self._step_open = True
+        self._step_is_current = False
+
+    def end_step(self):
+        self._step_open = False
+        self._step_is_current = False
+
+    def record(self, record):
+        """Record an already applied `record`."""
+        self._check_data()
+
+        if self.can_redo():
+            self._nbytes -= self._steps_nbytes(self.steps[self.position :])
+            del self.steps[self.position :]
+
+        if self._step_is_current:
+            self.steps[-1].append(record)
+        else:
+            self.steps.append([record])
+            self.position += 1
+        self._step_is_current = self._step_open
+        self._nbytes += record.nbytes
+
+        if self.max_bytes is not None:
+            while self._nbytes > self.max_bytes and len(self.steps) > 1:
+                self._nbytes -= self._steps_nbytes(self.steps[:1])
+                del self.steps[0]
+                self.position -= 1
+
+        self._log_event(record, +1)
+
+    @staticmethod
+    def _steps_nbytes(steps):
+        return sum(record.nbytes for step in steps for record in step)
+
+    def undo(self):
+        self._check_data()
+        if not self.can_undo():
+            return
+
+        self.end_step()
+        self.position -= 1
+        step = self.steps[self.position]
+        for record in reversed(step):
+            self._apply(record, -1)
+
+    def redo(self):
+        self._check_data()
+        if not self.can_redo():
+            return
+
+        self.end_step()
+        step = self.steps[self.position]
+        self.position += 1
+        for record in step:
+            self._apply(record, +1)
+
+    def _apply(self, record, direction):
+        if self.labels is not None:
+            record.apply(self.labels, direction)
+        self._log_event(record, direction)
+
+        if self.layer is not None:
+            self.layer.refresh()
+
+    def _log_event(self, record, direction):
+        self.revision += 1
+        if len(self._readers) > 0:
+            self._log.append((record, direction))
+        else:
+            self._log_offset += 1
+
+    def replay(self, labels):
+        """Apply all currently applied steps to `labels` in order."""
+        for step in self.steps[: self.position]:
+            for record in step:
+                record.apply(labels, +1)
+
+    def subscribe(self, *, replay=False):
+        """Return a reader that consumes the log from now on.
+
+        With `replay`, the reader first yields all currently applied records.
+        """
+        self._check_data()
+        reader = JournalReader(self, self._log_offset + len(self._log))
+        if replay:
+            reader.pending = [
+                (record, +1) for step in self.steps[: self.position] for record in step
+            ]
+        self._readers.add(reader)
+
+        return reader
+
+    def _read(self, reader):
+        self._check_data()
+        if reader.generation != self.generation:
+            reader.generation = self.generation
+            reader.position = self._log_offset + len(self._log)
+            reader.pending = []
+
+        events = reader.pending + self._log[reader.position - self._log_offset :]
+        reader.pending = []
+        reader.position = self._log_offset + len(self._log)
+
+        # drop log events seen by all readers
+        seen = max(min(r.position for r in self._readers), self._log_offset)
+        del self._log[: seen - self._log_offset]
+        self._log_offset = seen
+
+        return events
+
+    def _record_history_item(self, event):
+        self.begin_step()
+        for atom in event.value:
+            self.record(LabelEdit.from_history_atom(self.labels.shape, atom))
+        self.end_step()
+
+
+class JournalReader:
+    """Cursor into the event log of an `EditJournal`."""
+
+    def __init__(self, journal, position):
+        self.journal = journal
+        self.position = position
+        self.generation = journal.generation
+        self.pending = []
+
+    def read(self):
+        """Return the `(record, direction)` events since the last read."""
+        return self.journal._read(self)
@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+
+from .guess_chromosome_labels import ChromosomeLabel
+
+
+def chromosome_counts(labels):
+    """Return the number of chromosomes in the group of each label."""
+    keys = pd.Series(
+        [
+            label.major if isinstance(label, ChromosomeLabel) else label
+            for label in labels
+        ]
+    )
+
+    return keys.map(keys.value_counts()).to_numpy()
+
+
+def chromosome_sizes(areas, counts, genome_size=0):
+    """Return the sizes (in Mb or in percent if `genome_size` is 0) estimated
+    from the `areas` of the labels and the `counts` of their groups."""
+    areas = np.asarray(areas, dtype=np.float64)
+    counts = np.asarray(counts)
+    gs = genome_size if genome_size > 0 else 100
+    nonzero_mask = counts > 0
+    rho = gs / np.sum(areas[nonzero_mask] / counts[nonzero_mask])
+    sizes = np.zeros_like(areas, dtype=np.float64)
+    sizes[nonzero_mask] = rho * areas[nonzero_mask]
+
+    return sizes
+
+
+def format_sizes(sizes, genome_size=0):
+    if genome_size > 0:
+        return np.char.mod("%.1f Mb", np.asarray(sizes, dtype=np.float64))
+    else:
+        return np.char.mod("%.2f%%", np.asarray(sizes, dtype=np.float64))
@@ -0,0 +1,73 @@
+from qtpy.QtCore import QTimer
+
+
+class EventCoalescer:
+    """Coalesce bursts of events into a single deferred call of `callback`.
+
+    The first event after a flush arms a single-shot timer and all events
+    arriving until the timer fires are merged into one call of `callback`,
+    i.e. `callback` is invoked at most once per `latency` milliseconds. The
+    default latency corresponds to a single frame at 60 Hz.
+
+    Pending events may be flushed early using `flush`; `flush_on_release` is a
+    mouse drag callback that does so when the mouse button is released. A
+    `latency` of `None` disables coalescing altogether, i.e. `callback` is
+    called synchronously for every event.
+    """
+
+    def __init__(self, callback, latency=16):
+        self.callback = callback
+        self.pending = False
+
+        self._timer = QTimer()
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self.flush)
+        self.latency = latency
+
+    @property
+    def latency(self):
+        return self._latency
+
+    @latency.setter
+    def latency(self, value):
+        if value is not None and value < 0:
+            raise ValueError("latency must be non-negative")
+
+        self._latency = value
+        if value is None:
+            self.flush()
+        else:
+            self._timer.setInterval(int(value))
+
+    def __call__(self, *args, **kwargs):
+        # the event payload is ignored; `callback` must inspect the current state
+        if self.latency is None:
+            self.callback()
+            return
+
+        self.pending = True
+        if not self._timer.isActive():
+            self._timer.start()
+
+    def flush(self):
+        """Immediately call `callback` if events are pending."""
+        self._timer.stop()
+
+        if self.pending:
+            self.pending = False
+            self.callback()
+
+    def cancel(self):
+        """Discard pending events without calling `callback`."""
+        self._timer.stop()
+        self.pending = False
+
+    def flush_on_release(self, layer, event):
+        """Mouse drag callback that flushes pending events on mouse release."""
+        yield
+
+        while event.type == "mouse_move":
+            yield
+
+        # defer until the layer's own release handlers have finished
+        QTimer.singleShot(0, self.flush)
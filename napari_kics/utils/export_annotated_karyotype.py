@@ -1,7 +1,18 @@
 import base64
-from tempfile import NamedTemporaryFile
+import os
+from io import BytesIO
 
+import imageio.v3 as iio
+import numpy as np
 from skimage import io
+from skimage.transform import resize
+
+# supported raster formats of the embedded karyotype
+__image_formats = {
+    "png": ("image/png", ".png"),
+    "jpeg": ("image/jpeg", ".jpg"),
+    "webp": ("image/webp", ".webp"),
+}
 
 __svg_template = """\
 <?xml version="1.0" encoding="UTF-8" standalone="no"?>
@@ -24,7 +35,7 @@ __svg_template = """\
         <g id="karyotype">
             <image x="0" y="0" width="{width}" height="{height}"
              preserveAspectRatio="none"
-             xlink:href="data:image/png;base64,{karyotype}"/>
+             xlink:href="{karyotype}"/>
         </g>
         <g id="annotations" fill="{color}" stroke="{color}"
          stroke-width="{stroke_width}"
@@ -43,6 +54,67 @@ __svg_annotation_template = """\
 """
 
 
+def write_base64(out, data, *, chunk_size=3 * 2**16):
+    """Write `data` to the text stream `out` as base64 in chunks.
+
+    `chunk_size` is a multiple of 3, so the chunks encode without padding and
+    concatenate to the encoding of the whole of `data`.
+    """
+    data = memoryview(data)
+    for start in range(0, len(data), chunk_size):
+        out.write(
+            str(
+                base64.standard_b64encode(data[start : start + chunk_size]),
+                encoding="ascii",
+            )
+        )
+
+
+def render_annotations(tags, sizes, bboxes):
+    """Render the SVG annotations of all `bboxes` at once."""
+    bboxes = np.asarray(bboxes).reshape(-1, 4)
+    ymin, xmin, ymax, xmax = bboxes.T
+
+    return "".join(
+        __svg_annotation_template.format(
+            x=x, y=y, tag=tag, size=size, width=width, height=height
+        )
+        for x, y, width, height, tag, size in zip(
+            xmin.tolist(),
+            ymin.tolist(),
+            (xmax - xmin).tolist(),
+            (ymax - ymin).tolist(),
+            tags,
+            sizes,
+        )
+    )
+
+
+def downsample(image, max_width):
+    """Resize `image` (keeping its dtype) to at most `max_width` pixels width."""
+    height, width = image.shape[:2]
+    if width <= max_width:
+        return image
+
+    shape = (max(1, round(height * max_width / width)), int(max_width))
+    resized = resize(
+        image,
+        shape + image.shape[2:],
+        anti_aliasing=True,
+        preserve_range=True,
+    )
+    if np.issubdtype(image.dtype, np.integer):
+        resized = np.round(resized)
+
+    return resized.astype(image.dtype)
+
+
+def linked_image_name(fname, image_format="png"):
+    """Return the name of the karyotype image linked from the SVG `fname` (see
+    `export_svg`)."""
+    return os.path.splitext(fname)[0] + "_karyotype" + __image_formats[image_format][1]
+
+
 def export_svg(
     fname,
     karyotype,
@@ -56,7 +128,24 @@ def export_svg(
     desc="Created with napari-kics.",
     stroke_width=1,
     font_size=1,
+    oversampling=None,
+    image_format="png",
+    image_quality=None,
+    external_image=False,
 ):
+    """Write an SVG of `karyotype` annotated with the `bboxes` and the labels
+    `tags` and `sizes`.
+
+    The karyotype is embedded at full resolution unless `oversampling` is
+    given, in which case it is downsampled to `oversampling * svg_width`
+    pixels width. It is encoded as `image_format` ("png", "jpeg" or "webp",
+    the latter two with `image_quality`) and inlined, or written next to
+    `fname` (see `linked_image_name`) and linked if `external_image` is set.
+
+    Returns the names of the files written.
+    """
+    mime_type, extension = __image_formats[image_format]
+    files = [fname]
     height = karyotype.shape[0]
     width = karyotype.shape[1]
     scale = svg_width / width
@@ -82,26 +171,33 @@ def export_svg(
         assert len(svg_parts) == 3
 
         outsvg.write(svg_parts[0])
-        with NamedTemporaryFile(suffix=".png") as temp_png:
-            io.imsave(temp_png.name, karyotype, check_contrast=False)
-            outsvg.write(
-                str(base64.standard_b64encode(temp_png.read()), encoding="ascii")
-            )
+
+        raster = np.asarray(karyotype)
+        if oversampling is not None:
+            raster = downsample(raster, oversampling * svg_width)
+        if image_format == "jpeg" and raster.ndim == 3 and raster.shape[2] == 4:
+            # JPEG has no alpha channel
+            raster = raster[..., :3]
+        options = {} if image_quality is None else {"quality": image_quality}
+
+        if external_image:
+            image_fname = linked_image_name(fname, image_format)
+            iio.imwrite(image_fname, raster, extension=extension, **options)
+            files.append(image_fname)
+            outsvg.write(os.path.basename(image_fname))
+        else:
+            # encode the image in memory and stream it into the SVG
+            outsvg.write(f"data:{mime_type};base64,")
+            with BytesIO() as buffer:
+                iio.imwrite(buffer, raster, extension=extension, **options)
+                write_base64(outsvg, buffer.getbuffer())
 
         outsvg.write(svg_parts[1])
-        for tag, size, (ymin, xmin, ymax, xmax) in zip(tags, sizes, bboxes):
-            outsvg.write(
-                __svg_annotation_template.format(
-                    x=xmin,
-                    y=ymin,
-                    tag=tag,
-                    size=size,
-                    width=xmax - xmin,
-                    height=ymax - ymin,
-                )
-            )
+        outsvg.write(render_annotations(tags, sizes, bboxes))
         outsvg.write(svg_parts[2])
 
+    return files
+
 
 __test_data = {
     "image": f"{__file__}/../../resources/data/mHomSap_male.jpeg",
@@ -0,0 +1,116 @@
+import itertools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import tifffile
+import zarr
+from numcodecs import Blosc
+from skimage.util import img_as_ubyte
+
+# output formats of the images saved by the saving widget
+image_formats = ("png", "tiff", "zarr")
+
+
+def minimal_label_dtype(labels):
+    """Return the smallest unsigned dtype that holds all ids of `labels`."""
+    return np.min_scalar_type(max(int(np.max(labels, initial=0)), 0))
+
+
+def to_ubyte(image):
+    """Convert a float image with values in [0, 1] (or a mask) to uint8.
+
+    Values outside of [0, 1] are clipped instead of failing the conversion.
+    """
+    image = np.asarray(image)
+    if image.dtype.kind == "f":
+        image = np.clip(image, 0, 1)
+
+    return img_as_ubyte(image)
+
+
+def _max_workers(max_workers):
+    return max_workers or min(32, os.cpu_count() or 1)
+
+
+def write_tiff(fname, data, *, tile=(256, 256), compression="zlib", max_workers=None):
+    """Write `data` as tiled TIFF compressing the tiles in parallel.
+
+    Masks (bool) are stored with one bit per pixel.
+    """
+    data = np.asarray(data)
+    tifffile.imwrite(
+        fname,
+        data,
+        tile=tile,
+        compression=compression,
+        predictor=data.dtype.kind in "ui" and data.itemsize > 1,
+        maxworkers=_max_workers(max_workers),
+    )
+
+
+def read_tiff(fname, *, max_workers=None):
+    """Read a TIFF written by `write_tiff` decoding the tiles in parallel."""
+    return tifffile.imread(fname, maxworkers=_max_workers(max_workers))
+
+
+def _chunk_slices(shape, chunks):
+    return [
+        tuple(slice(start, start + size) for start, size in zip(starts, chunks))
+        for starts in itertools.product(
+            *(range(0, length, size) for length, size in zip(shape, chunks))
+        )
+    ]
+
+
+def write_zarr(group, name, data, *, chunks=(1024, 1024), max_workers=None):
+    """Write `data` as compressed array `name` of the Zarr `group` (or path),
+    one chunk per worker thread.
+
+    Masks (bool) are stored bit-packed along their last axis.
+    """
+    if not isinstance(group, zarr.Group):
+        group = zarr.open_group(os.fspath(group), mode="a")
+
+    data = np.asarray(data)
+    chunks = tuple(chunks[: data.ndim]) + data.shape[len(chunks) :]
+    attrs = {}
+    if data.dtype == bool:
+        attrs["packbits"] = data.shape[-1]
+        data = np.packbits(data, axis=-1)
+        chunks = chunks[:-1] + (max(1, chunks[-1] // 8),)
+
+    array = group.create(
+        name,
+        shape=data.shape,
+        chunks=chunks,
+        dtype=data.dtype,
+        compressor=Blosc(cname="zstd", clevel=5, shuffle=Blosc.BITSHUFFLE),
+        overwrite=True,
+    )
+    array.attrs.update(attrs)
+
+    def write_chunk(index):
+        array[index] = data[index]
+
+    with ThreadPoolExecutor(max_workers=_max_workers(max_workers)) as executor:
+        list(executor.map(write_chunk, _chunk_slices(data.shape, chunks)))
+
+    return array
+
+
+def read_zarr(array, *, max_workers=None):
+    """Read a Zarr array written by `write_zarr`, one chunk per worker thread."""
+    data = np.empty(array.shape, dtype=array.dtype)
+
+    def read_chunk(index):
+        data[index] = array[index]
+
+    with ThreadPoolExecutor(max_workers=_max_workers(max_workers)) as executor:
+        list(executor.map(read_chunk, _chunk_slices(array.shape, array.chunks)))
+
+    if "packbits" in array.attrs:
+        data = np.unpackbits(data, axis=-1, count=array.attrs["packbits"])
+        data = data.astype(bool)
+
+    return data
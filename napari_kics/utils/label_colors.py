@@ -0,0 +1,73 @@
+"""Default colors of napari labels layers, without importing napari.
+
+Follows `label_colormap` and `low_discrepancy_image` of
+`napari.utils.colormaps.colormap_utils` (napari 0.4, BSD-3-Clause), so that
+headless runs (see `pipeline`) color labels exactly like the viewer.
+"""
+import warnings
+
+import numpy as np
+from skimage.color import lab2rgb
+
+# bounds of the LAB coordinates of all RGB colors
+_LABMIN = np.array([0.0, -86.18302974, -107.85730021])
+_LABMAX = np.array([100.0, 98.23305386, 94.47812228])
+
+
+def _low_discrepancy(n, seed=0.5):
+    """Return `n` points of a 3d quasirandom sequence starting at `seed`."""
+    phi = np.array(
+        [1.6180339887498948482, 1.32471795724474602596, 1.22074408460575947536]
+    )
+    g = 1 / phi
+
+    return (np.broadcast_to(seed, (1, 3)) + np.arange(n)[:, None] * g) % 1
+
+
+def _random_colors(n, seed=0.5):
+    """Return `n` RGB colors drawn quasirandomly from the LAB color space."""
+    factor = 6
+    rgb = np.zeros((0, 3))
+    while len(rgb) < n:
+        lab = _low_discrepancy(n * factor, seed) * (_LABMAX - _LABMIN) + _LABMIN
+        with warnings.catch_warnings():
+            # LAB coordinates outside the RGB gamut are dropped below
+            warnings.simplefilter("ignore", UserWarning)
+            raw_rgb = lab2rgb(lab)
+        rgb = raw_rgb[np.all((raw_rgb > 0) & (raw_rgb < 1), axis=1)]
+        factor *= 2
+
+    return rgb[:n]
+
+
+def label_colormap(num_colors=50, seed=0.5):
+    """Return the RGBA colors and control points of the default colormap of
+    labels layers with `num_colors` colors (0 is transparent)."""
+    midpoints = np.linspace(0.00001, 1 - 0.00001, num_colors)
+    controls = np.concatenate(([0], midpoints, [1.0]))
+    colors = np.concatenate(
+        (_random_colors(num_colors + 1, seed), np.ones((num_colors + 1, 1))), axis=1
+    )
+    colors[0, :] = 0
+
+    # napari keeps colormaps in single precision
+    return colors.astype(np.float32), controls.astype(np.float32)
+
+
+def low_discrepancy_image(image, seed=0.5, margin=1 / 256):
+    """Map the label ids `image` quasirandomly to [`margin`, 1 - `margin`]."""
+    image = seed + np.float32(image) * 0.6180339887498948482
+
+    return margin + (1 - 2 * margin) * (image - np.floor(image))
+
+
+def label_colors(ids, *, num_colors=50, seed=0.5):
+    """Return the RGBA colors (floats) of the label `ids` as shown by a labels
+    layer with the default colormap (`num_colors` and `seed`)."""
+    colors, controls = label_colormap(num_colors)
+    values = np.where(ids != 0, low_discrepancy_image(ids, seed), 0)
+    indices = np.clip(
+        np.searchsorted(controls, values, side="right") - 1, 0, len(colors) - 1
+    )
+
+    return colors[indices]
@@ -1,7 +1,16 @@
+import logging
+
 import numpy as np
 
+from .edit_journal import EditJournal, LabelEdit
+from .label_occupancy import LabelOccupancy
+
+log = logging.getLogger(__name__)
+
 
 class ChangeRecord:
+    __slots__ = ("area_diff", "xs", "ys")
+
     def __init__(self, area_diff, xs, ys):
         self.area_diff = area_diff
         self.xs = xs
@@ -11,22 +20,23 @@ class ChangeRecord:
         return (self.xs[0], self.ys[0])
 
     def bbox(self, bbox=None):
+        """Return the (inclusive) bounding box of the changed pixels, extended
+        by `bbox` if given."""
+        _bbox = (
+            int(self.xs.min()),
+            int(self.ys.min()),
+            int(self.xs.max()),
+            int(self.ys.max()),
+        )
         if bbox is None:
-            return (
-                min(self.xs),
-                min(self.ys),
-                max(self.xs),
-                max(self.ys),
-            )
-        else:
-            _bbox = self.bbox()
-
-            return (
-                min(_bbox[0], bbox[0]),
-                min(_bbox[1], bbox[1]),
-                max(_bbox[2], bbox[2]),
-                max(_bbox[3], bbox[3]),
-            )
+            return _bbox
+
+        return (
+            min(_bbox[0], bbox[0]),
+            min(_bbox[1], bbox[1]),
+            max(_bbox[2], bbox[2]),
+            max(_bbox[3], bbox[3]),
+        )
 
     def __str__(self):
         return (
@@ -39,113 +49,66 @@ class ChangeRecord:
 
 
 class LabelHistoryProcessor:
-    def __init__(self, label_layer):
+    """Summarise the edits of a labels layer per label.
 
-        self.label_layer = label_layer
-        self.history_queue_length = 0
-        self.history_last_step_length = 0
+    The edits are consumed from the layer's `EditJournal`, so every paint,
+    fill, undo and redo is reported exactly once. They are also applied to
+    the `occupancy` of the labels which provides up-to-date areas and
+    bounding boxes (see `reset`).
+    """
 
-    def recent_changes(self):
-        print("[recent_changes]: entry")
-        # print(f"[recent_changes]: undo history is {self.label_layer._undo_history}")
-        # print(f"[recent_changes]: redo history is {self.label_layer._redo_history}")
-
-        if (
-            len(self.label_layer._undo_history) == 0
-            and len(self.label_layer._redo_history) == 0
-        ):
-            # no undo/redo history...
-            #
-            # NOTE: apparently, undo and redo history get erased upon
-            #       the layer visibility toggle
-            self.history_queue_length = 0
-            self.history_last_step_length = 0
-
-            return {}
-
-        elif len(self.label_layer._undo_history) > self.history_queue_length:
-            # new actions were taken, i.e. undoable actions accumulated...
-            factor = +1
-
-            # collect new actions since last processsing
-            step = list()
-            for i in range(
-                self.history_queue_length, len(self.label_layer._undo_history)
-            ):
-                step.extend(self.label_layer._undo_history[i])
-
-            self.history_queue_length = len(self.label_layer._undo_history)
-            self.history_last_step_length = len(step)
+    def __init__(self, label_layer):
 
-        elif len(self.label_layer._undo_history) < self.history_queue_length:
-            # actions were undone, i.e. redoable actions accumulated...
-            factor = -1
+        self.label_layer = label_layer
+        self.journal = EditJournal.attach(label_layer)
+        self.reader = self.journal.subscribe()
+        self.occupancy = None
 
-            # collect undone actions since last processsing
-            nsteps = min(
-                self.history_queue_length - len(self.label_layer._undo_history),
-                len(self.label_layer._redo_history),
-            )
+    def reset(self):
+        """Discard pending changes and recount the occupancy of the labels."""
+        self.reader.read()
+        self.occupancy = LabelOccupancy(self.label_layer.data)
 
-            step = list()
-            for i in range(nsteps):
-                step.extend(
-                    self.label_layer._redo_history[
-                        len(self.label_layer._redo_history) - nsteps + i
-                    ]
-                )
-
-            self.history_queue_length = len(self.label_layer._undo_history)
-            self.history_last_step_length = 0
-
-        elif (
-            len(self.label_layer._undo_history) != 0
-            and len(self.label_layer._undo_history[-1]) > self.history_last_step_length
-        ):
-            # partially new actions were taken, i.e. the last undo step
-            # accumulated more undoable actions
-            factor = +1
-
-            # collect partially new actions
-            step = self.label_layer._undo_history[-1]
-            new_length = len(step)
-            step = step[self.history_last_step_length : new_length]
-            self.history_queue_length = len(self.label_layer._undo_history)
-            self.history_last_step_length = new_length
-
-        else:
+    def recent_changes(self):
+        events = [
+            (record, direction)
+            for record, direction in self.reader.read()
+            if isinstance(record, LabelEdit)
+        ]
+        if len(events) == 0:
             # all actions are accounted for, i.e. nothing to do
             return {}
 
-        print(f"[recent_changes] found {len(step)} steps: {step}")
+        log.debug("found %d edits", len(events))
 
         changes = {}
 
-        def extend_changes(label, area, xs, ys):
-            if label in changes:
-                changes[label].area_diff += factor * area
-                changes[label].xs = np.concatenate((changes[label].xs, xs))
-                changes[label].ys = np.concatenate((changes[label].ys, ys))
-            else:
-                changes[label] = ChangeRecord(factor * area, xs, ys)
-
-        for (xs, ys), old_labels, new_label in step:
-            removed_labels, removed_labels_area = np.unique(
-                old_labels, return_counts=True
+        def extend_changes(labels, factor, xs, ys):
+            # group the pixels by label
+            order = np.argsort(labels, kind="stable")
+            labels, starts, areas = np.unique(
+                labels[order], return_index=True, return_counts=True
             )
-
-            total_removed_area = 0
-            for label, area in zip(removed_labels, removed_labels_area):
-                extend_changes(
-                    label,
-                    -area,
-                    xs[total_removed_area : total_removed_area + area],
-                    ys[total_removed_area : total_removed_area + area],
-                )
-                total_removed_area += area
-
-            extend_changes(new_label, total_removed_area, xs, ys)
-
-        print(f"[recent_changes] changes since last call: {changes}")
+            xs, ys = xs[order], ys[order]
+
+            for label, start, area in zip(labels.tolist(), starts, areas):
+                _xs, _ys = xs[start : start + area], ys[start : start + area]
+                if self.occupancy is not None:
+                    self.occupancy.update(label, _xs, _ys, factor)
+                if label in changes:
+                    changes[label].area_diff += factor * int(area)
+                    changes[label].xs = np.concatenate((changes[label].xs, _xs))
+                    changes[label].ys = np.concatenate((changes[label].ys, _ys))
+                else:
+                    changes[label] = ChangeRecord(factor * int(area), _xs, _ys)
+
+        for record, direction in events:
+            old_labels, new_labels = record.values(direction)
+            xs, ys = np.unravel_index(record.flat_indices(), record.shape)
+
+            extend_changes(old_labels, -1, xs, ys)
+            extend_changes(new_labels, +1, xs, ys)
+
+        log.debug("changes since last call: %s", changes)
 
         return changes
@@ -0,0 +1,133 @@
+import numpy as np
+
+
+class Histogram:
+    """Pixel counts per position along one image axis, stored only over the
+    occupied extent (`counts[i]` is the count at position `start + i`)."""
+
+    __slots__ = ("start", "counts")
+
+    def __init__(self, start=0, counts=None):
+        self.start = start
+        self.counts = np.zeros(0, dtype=np.int64) if counts is None else counts
+
+    @classmethod
+    def from_sparse(cls, positions, counts):
+        """Create from sorted `positions` with their pixel `counts`."""
+        hist = np.zeros(positions[-1] - positions[0] + 1, dtype=np.int64)
+        hist[positions - positions[0]] = counts
+
+        return cls(int(positions[0]), hist)
+
+    def add(self, positions, factor=+1):
+        """Add (or remove, if `factor` is negative) pixels at `positions`."""
+        lo, hi = int(positions.min()), int(positions.max()) + 1
+
+        if len(self.counts) == 0:
+            self.start, self.counts = lo, np.zeros(hi - lo, dtype=np.int64)
+        elif lo < self.start or hi > self.start + len(self.counts):
+            # grow to cover the new positions
+            start = min(lo, self.start)
+            counts = np.zeros(
+                max(hi, self.start + len(self.counts)) - start, dtype=np.int64
+            )
+            counts[
+                self.start - start : self.start - start + len(self.counts)
+            ] = self.counts
+            self.start, self.counts = start, counts
+
+        self.counts[lo - self.start : hi - self.start] += factor * np.bincount(
+            positions - lo, minlength=hi - lo
+        )
+
+    def extent(self):
+        """Return the occupied `(start, stop)` or None; trims the storage."""
+        nonzero = np.flatnonzero(self.counts)
+        if len(nonzero) == 0:
+            self.start, self.counts = 0, self.counts[:0]
+            return None
+
+        self.counts = self.counts[nonzero[0] : nonzero[-1] + 1]
+        self.start += int(nonzero[0])
+
+        return self.start, self.start + len(self.counts)
+
+    def total(self):
+        return int(self.counts.sum())
+
+
+class LabelOccupancy:
+    """Row and column occupancy histograms of every label of a 2D label image.
+
+    Kept up-to-date from pixel deltas (see `update`), the histograms yield the
+    area and bounding box of a label in O(bbox extent) instead of a rescan of
+    the image. The background label 0 is not tracked.
+    """
+
+    def __init__(self, labels):
+        self.shape = labels.shape
+        self.rows = {}
+        self.cols = {}
+
+        n_rows, n_cols = labels.shape
+        max_label = int(labels.max(initial=0))
+        if (max_label + 1) * max(n_rows, n_cols) <= labels.size:
+            # small ids can be counted directly
+            ids, inverse = np.arange(max_label + 1), labels.astype(np.intp)
+        else:
+            ids, inverse = np.unique(labels, return_inverse=True)
+            inverse = inverse.reshape(labels.shape)
+
+        for hists, keys, size in (
+            (self.rows, inverse * n_rows + np.arange(n_rows)[:, None], n_rows),
+            (self.cols, inverse * n_cols + np.arange(n_cols)[None, :], n_cols),
+        ):
+            if len(ids) * size <= keys.size:
+                # few labels: count densely
+                counts = np.bincount(keys.ravel(), minlength=len(ids) * size)
+                keys = np.flatnonzero(counts)
+                counts = counts[keys]
+            else:
+                keys, counts = np.unique(keys, return_counts=True)
+            owners, positions = np.divmod(keys, size)
+            splits = np.searchsorted(owners, np.arange(1, len(ids)))
+            for id, _positions, _counts in zip(
+                ids.tolist(), np.split(positions, splits), np.split(counts, splits)
+            ):
+                if id != 0 and len(_positions) > 0:
+                    hists[id] = Histogram.from_sparse(_positions, _counts)
+
+    def __contains__(self, label):
+        return label in self.rows
+
+    def update(self, label, rows, cols, factor=+1):
+        """Add (or remove, if `factor` is negative) the pixels `(rows, cols)`
+        to (from) `label`."""
+        if label == 0 or len(rows) == 0:
+            return
+
+        if label not in self.rows:
+            self.rows[label] = Histogram()
+            self.cols[label] = Histogram()
+        self.rows[label].add(rows, factor)
+        self.cols[label].add(cols, factor)
+
+    def area(self, label):
+        return self.rows[label].total() if label in self.rows else 0
+
+    def bbox(self, label):
+        """Return the bounding box of `label` like `regionprops` does, i.e.
+        `(min_row, min_col, max_row + 1, max_col + 1)`, or None if it is gone."""
+        if label not in self.rows:
+            return None
+
+        row_extent = self.rows[label].extent()
+        col_extent = self.cols[label].extent()
+        if row_extent is None or col_extent is None:
+            del self.rows[label], self.cols[label]
+            return None
+
+        return (row_extent[0], col_extent[0], row_extent[1], col_extent[1])
+
+    def labels(self):
+        return sorted(self.rows)
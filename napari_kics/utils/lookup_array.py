@@ -0,0 +1,47 @@
+import numpy as np
+
+
+class LookupArray:
+    """Read-only array-like that lazily maps `labels` through `lut`.
+
+    Indexing yields `lut[labels[key]]`; only the requested part of `labels` is
+    ever translated, so the view costs no memory beyond `lut` itself and
+    updates to `lut` become visible on the next read. Labels exceeding the
+    table are mapped to zero.
+    """
+
+    def __init__(self, labels, lut):
+        self.labels = labels
+        self.lut = lut
+
+    @property
+    def shape(self):
+        return self.labels.shape
+
+    @property
+    def ndim(self):
+        return self.labels.ndim
+
+    @property
+    def size(self):
+        return self.labels.size
+
+    @property
+    def dtype(self):
+        return self.lut.dtype
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __getitem__(self, key):
+        labels = np.asarray(self.labels[key])
+        values = np.zeros(labels.shape, dtype=self.lut.dtype)
+        inside = labels < len(self.lut)
+        values[inside] = self.lut[labels[inside]]
+
+        return values
+
+    def __array__(self, dtype=None):
+        values = self[...]
+
+        return values if dtype is None else values.astype(dtype)
@@ -0,0 +1,75 @@
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+
+def content_hash(*inputs):
+    """Return a hex digest of `inputs`.
+
+    Arrays are hashed by dtype, shape and content, pandas objects by their
+    values and index, and anything else by its `repr`.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+
+    def feed(value):
+        if isinstance(value, (list, tuple)):
+            digest.update(f"{type(value).__name__}[{len(value)}]".encode())
+            for item in value:
+                feed(item)
+        elif isinstance(value, dict):
+            feed(sorted(value.items(), key=lambda item: repr(item[0])))
+        elif isinstance(value, (pd.DataFrame, pd.Series)):
+            digest.update(value.to_csv().encode())
+        elif isinstance(value, np.ndarray) or hasattr(value, "__array__"):
+            value = np.ascontiguousarray(value)
+            digest.update(f"{value.dtype}{value.shape}".encode())
+            digest.update(value.reshape(-1).view(np.uint8))
+        else:
+            digest.update(repr(value).encode())
+
+    feed(inputs)
+
+    return digest.hexdigest()
+
+
+class Manifest:
+    """Map of the artifacts in a directory to hashes of their inputs.
+
+    Stored as `manifest.json` next to the artifacts; an artifact is current if
+    its inputs hash is unchanged and all of its files still exist.
+    """
+
+    fname = "manifest.json"
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(os.path.join(path, self.fname)) as manifest:
+                self.artifacts = json.load(manifest)
+        except (OSError, ValueError):
+            self.artifacts = {}
+
+    def is_current(self, name, inputs_hash):
+        entry = self.artifacts.get(name)
+
+        return (
+            entry is not None
+            and entry["inputs"] == inputs_hash
+            and all(os.path.exists(os.path.join(self.path, f)) for f in entry["files"])
+        )
+
+    def update(self, name, inputs_hash, files):
+        with self._lock:
+            self.artifacts[name] = {"inputs": inputs_hash, "files": list(files)}
+
+    def save(self):
+        with self._lock:
+            tmp_fname = os.path.join(self.path, f".{self.fname}.tmp")
+            with open(tmp_fname, "w") as manifest:
+                json.dump(self.artifacts, manifest, indent=2, sort_keys=True)
+            os.replace(tmp_fname, os.path.join(self.path, self.fname))
@@ -0,0 +1,118 @@
+from functools import lru_cache
+
+import imageio.v3 as iio
+import numpy as np
+from PIL import Image, ImageColor, ImageDraw, ImageFont
+from skimage.color import gray2rgb
+from skimage.transform import resize
+from skimage.util import img_as_ubyte
+
+from .image_io import to_ubyte
+
+# characters available in the glyph atlas
+__atlas_chars = [chr(code) for code in range(32, 127)]
+
+
+@lru_cache(maxsize=8)
+def glyph_atlas(height):
+    """Return the alpha masks (uint8) of the printable ASCII characters rendered
+    with the default font at `height` pixels line height."""
+    try:
+        font = ImageFont.load_default(size=height)
+        scale = None
+    except TypeError:
+        # Pillow < 10.1 only has a fixed-size bitmap font; scale its glyphs
+        font = ImageFont.load_default()
+        scale = height / font.getbbox("Ag|")[3]
+
+    line_height = font.getbbox("Ag|")[3]
+    atlas = {}
+    for char in __atlas_chars:
+        glyph = Image.new("L", (max(1, round(font.getlength(char))), line_height))
+        ImageDraw.Draw(glyph).text((0, 0), char, fill=255, font=font)
+        glyph = np.asarray(glyph)
+        if scale is not None:
+            shape = (height, max(1, round(glyph.shape[1] * scale)))
+            glyph = img_as_ubyte(resize(glyph, shape, order=1))
+        atlas[char] = glyph
+
+    return atlas
+
+
+def render_text(text, height):
+    """Return the alpha mask (uint8) of the single line `text`."""
+    atlas = glyph_atlas(height)
+    glyphs = [atlas.get(char, atlas["?"]) for char in text]
+
+    return np.hstack(glyphs) if glyphs else np.zeros((height, 0), dtype=np.uint8)
+
+
+def blend(image, alpha, y, x, color):
+    """Blend `color` with opacity `alpha` (uint8 mask) into `image` at `(y, x)`,
+    clipping at the image borders."""
+    y0, x0 = max(y, 0), max(x, 0)
+    y1 = min(y + alpha.shape[0], image.shape[0])
+    x1 = min(x + alpha.shape[1], image.shape[1])
+    if y0 >= y1 or x0 >= x1:
+        return
+
+    alpha = alpha[y0 - y : y1 - y, x0 - x : x1 - x, None] / 255
+    region = image[y0:y1, x0:x1]
+    region[...] = np.round(region * (1 - alpha) + color * alpha)
+
+
+def render_annotated_karyotype(
+    karyotype,
+    tags,
+    sizes,
+    bboxes,
+    *,
+    display_width=1000,
+    color="red",
+    stroke_width=1,
+    font_size=1,
+):
+    """Draw the `bboxes` and the labels `tags` and `sizes` onto an RGB (uint8)
+    copy of `karyotype`.
+
+    Stroke width and font size are scaled like in `export_svg`, i.e. relative
+    to the karyotype shown `display_width` pixels wide, so the result does not
+    depend on the screen or the size of the input. `color` is any CSS color
+    string, as in the SVG.
+    """
+    image = to_ubyte(karyotype)
+    if image.ndim == 2:
+        image = gray2rgb(image)
+    else:
+        image = image[..., :3].copy()
+
+    scale = image.shape[1] / display_width
+    color = np.array(ImageColor.getrgb(color)[:3], dtype=np.uint8)
+    stroke = max(1, round(stroke_width * scale))
+    font_height = max(6, round(16 * font_size * scale))
+
+    bboxes = np.asarray(bboxes, dtype=np.int_).reshape(-1, 4)
+    ymin, xmin, ymax, xmax = np.clip(
+        bboxes, 0, np.array(image.shape[:2] * 2) - 1
+    ).T.tolist()
+
+    for y0, x0, y1, x1 in zip(ymin, xmin, ymax, xmax):
+        # rectangle outline, growing inwards from the bbox
+        image[y0 : y0 + stroke, x0 : x1 + 1] = color
+        image[max(y1 - stroke + 1, y0) : y1 + 1, x0 : x1 + 1] = color
+        image[y0 : y1 + 1, x0 : x0 + stroke] = color
+        image[y0 : y1 + 1, max(x1 - stroke + 1, x0) : x1 + 1] = color
+
+    for tag, size, y0, x0 in zip(tags, sizes, ymin, xmin):
+        text = render_text(f"{tag}: {size}", font_height)
+        # like the SVG, the text sits just above the bbox
+        blend(image, text, y0 - 5 - text.shape[0], x0, color)
+
+    return image
+
+
+def export_png(fname, karyotype, tags, sizes, bboxes, **kwargs):
+    """Write the annotated karyotype (see `render_annotated_karyotype`)."""
+    iio.imwrite(
+        fname, render_annotated_karyotype(karyotype, tags, sizes, bboxes, **kwargs)
+    )
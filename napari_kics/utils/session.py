@@ -0,0 +1,145 @@
+import os
+
+import numpy as np
+import pandas as pd
+import zarr
+from numcodecs import Blosc, VLenUTF8
+
+from .guess_chromosome_labels import ChromosomeLabel
+from .image_io import minimal_label_dtype
+
+session_format = "napari-kics-session"
+session_version = 1
+
+# columns of the estimates table stored in a session
+table_columns = ("ids", "labels", "counts", "areas", "bboxes")
+
+
+def _compressor():
+    return Blosc(cname="zstd", clevel=5, shuffle=Blosc.BITSHUFFLE)
+
+
+def _store_array(group, name, data, chunks=True):
+    data = np.asarray(data)
+    if data.dtype.kind in "OU":
+        return group.array(
+            name, data.astype(object), dtype=object, object_codec=VLenUTF8()
+        )
+
+    return group.array(name, data, chunks=chunks, compressor=_compressor())
+
+
+def save_session(
+    path,
+    *,
+    image,
+    labels,
+    table,
+    params,
+    genome_size=0,
+    image_name=None,
+    image_source=None,
+    layers=None,
+    matching=None,
+    chunks=(1024, 1024),
+):
+    """Write a session snapshot to the Zarr directory `path`.
+
+    `table` maps the `table_columns` to arrays, `params` are the
+    preprocessing parameters and `layers` optional intermediate images by
+    name. The input `image` (layer `image_name`) is always stored, so the
+    session does not depend on `image_source` which is only recorded. All
+    images are stored as chunked, compressed arrays.
+    """
+    # the images may be lazily loaded from the session being overwritten
+    image = np.asarray(image)
+    labels = np.asarray(labels)
+    layers = {name: np.asarray(data) for name, data in (layers or {}).items()}
+
+    root = zarr.open_group(os.fspath(path), mode="w")
+    root.attrs.update(
+        {
+            "format": session_format,
+            "version": session_version,
+            "image_name": image_name,
+            "image_source": None if image_source is None else os.fspath(image_source),
+            "params": {key: _to_json(value) for key, value in params.items()},
+            "genome_size": _to_json(genome_size),
+        }
+    )
+
+    _store_array(root, "image", image, chunks=chunks + np.shape(image)[2:])
+
+    _store_array(root, "labels", labels.astype(minimal_label_dtype(labels)), chunks)
+
+    images = root.create_group("layers")
+    for name, data in layers.items():
+        if data.dtype == np.float64:
+            data = data.astype(np.float32)
+        _store_array(images, name, data, chunks=chunks + data.shape[2:])
+
+    table_group = root.create_group("table")
+    for column in table_columns:
+        values = table[column]
+        if column == "labels":
+            values = [str(value) for value in values]
+        _store_array(table_group, column, values)
+
+    if matching is not None:
+        matching_group = root.create_group("matching")
+        matching_group.attrs["columns"] = list(map(str, matching.columns))
+        for column in matching.columns:
+            values = matching[column].to_numpy()
+            if values.dtype == object:
+                values = values.astype(str)
+            _store_array(matching_group, str(column), values)
+
+
+def load_session(path):
+    """Open the session snapshot at `path`.
+
+    Images are returned as Zarr arrays that load their chunks on access; the
+    table and matching are loaded into memory.
+    """
+    root = zarr.open_group(os.fspath(path), mode="r")
+    if root.attrs.get("format") != session_format:
+        raise ValueError(f"{path} is not a napari-kics session")
+    if root.attrs["version"] > session_version:
+        raise ValueError(f"unsupported session version {root.attrs['version']}")
+
+    session = {
+        "image_name": root.attrs["image_name"],
+        "image_source": root.attrs["image_source"],
+        "params": dict(root.attrs["params"]),
+        "genome_size": root.attrs["genome_size"],
+        "image": root["image"] if "image" in root else None,
+        "labels": root["labels"],
+        "layers": {name: array for name, array in root["layers"].arrays()},
+        "table": {column: root["table"][column][:] for column in table_columns},
+        "matching": None,
+    }
+    session["table"]["labels"] = [
+        _parse_label(label) for label in session["table"]["labels"]
+    ]
+
+    if "matching" in root:
+        matching_group = root["matching"]
+        session["matching"] = pd.DataFrame(
+            {
+                column: matching_group[column][:]
+                for column in matching_group.attrs["columns"]
+            }
+        )
+
+    return session
+
+
+def _parse_label(label):
+    try:
+        return ChromosomeLabel.from_string(label)
+    except ValueError:
+        return label
+
+
+def _to_json(value):
+    return value.item() if isinstance(value, np.generic) else value
@@ -0,0 +1,158 @@
+"""Arrays in shared memory for worker processes.
+
+`autotune` shares the input image and the blurred candidates with its
+workers through a `SharedArrayRegistry` instead of pickling them per task.
+Batch runs (see `batch`) do not need it: every worker reads its own image
+and returns only the names of the files written.
+"""
+import os
+import threading
+from collections import namedtuple
+from multiprocessing import parent_process, resource_tracker, shared_memory
+
+import numpy as np
+
+# segments attached by this process (see `SharedArrayHandle.attach`)
+_attached = {}
+# names of the segments created by the registries of this process
+_created = set()
+_attach_lock = threading.Lock()
+
+
+def _attach_segment(name):
+    try:
+        return shared_memory.SharedMemory(name, track=False)
+    except TypeError:
+        pass
+
+    # before Python 3.13, attaching registers the segment with the resource
+    # tracker, which would then unlink it when this process exits although it
+    # is owned by the registry of another process; child processes share the
+    # tracker of their parent (which only keeps one entry per segment), so
+    # there the registration must stay
+    segment = shared_memory.SharedMemory(name)
+    if os.name == "posix" and parent_process() is None and name not in _created:
+        resource_tracker.unregister(segment._name, "shared_memory")
+
+    return segment
+
+
+class SharedArrayHandle(namedtuple("SharedArrayHandle", ["name", "shape", "dtype"])):
+    """Picklable reference to an array in shared memory (see
+    `SharedArrayRegistry`) that is passed to worker processes instead of the
+    array itself."""
+
+    __slots__ = ()
+
+    def attach(self):
+        """Return the shared array (no copy); writes are seen by all processes.
+
+        The segment stays mapped until `detach` is called.
+        """
+        with _attach_lock:
+            segment = _attached.get(self.name)
+            if segment is None:
+                segment = _attached[self.name] = _attach_segment(self.name)
+
+        return np.ndarray(self.shape, dtype=self.dtype, buffer=segment.buf)
+
+    def detach(self):
+        """Unmap the segment from this process (arrays returned by `attach`
+        must not be used afterwards)."""
+        with _attach_lock:
+            segment = _attached.pop(self.name, None)
+        if segment is not None:
+            segment.close()
+
+
+class SharedArrayRegistry:
+    """Owner of arrays in shared memory.
+
+    Every array starts with one reference, `acquire` and `release` add and
+    drop references and the memory is freed when the last one is released.
+    Closing the registry (also on leaving its context) frees all remaining
+    arrays.
+    """
+
+    def __init__(self):
+        self._segments = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        return len(self._segments)
+
+    def empty(self, shape, dtype):
+        """Allocate an uninitialized shared array and return its handle."""
+        shape = tuple(int(n) for n in np.atleast_1d(shape))
+        dtype = np.dtype(dtype)
+        nbytes = int(np.prod(shape, dtype=np.int64)) * dtype.itemsize
+        segment = shared_memory.SharedMemory(create=True, size=max(nbytes, 1))
+
+        handle = SharedArrayHandle(segment.name, shape, dtype.str)
+        with self._lock:
+            self._segments[handle.name] = [segment, 1]
+        with _attach_lock:
+            _created.add(handle.name)
+
+        return handle
+
+    def share(self, array):
+        """Copy `array` to shared memory and return its handle."""
+        array = np.asarray(array)
+        handle = self.empty(array.shape, array.dtype)
+        self.array(handle)[...] = array
+
+        return handle
+
+    def array(self, handle):
+        """Return the shared array of `handle` (no copy)."""
+        segment = self._segments[handle.name][0]
+
+        return np.ndarray(handle.shape, dtype=handle.dtype, buffer=segment.buf)
+
+    def acquire(self, handle):
+        """Add a reference to `handle` (e.g. for a task that uses it)."""
+        with self._lock:
+            self._segments[handle.name][1] += 1
+
+        return handle
+
+    def release(self, handle):
+        """Drop a reference to `handle` and free its memory if it was the last."""
+        with self._lock:
+            entry = self._segments[handle.name]
+            entry[1] -= 1
+            if entry[1] > 0:
+                return
+            del self._segments[handle.name]
+
+        self._free(entry[0])
+
+    def close(self):
+        """Free all arrays, regardless of their references."""
+        with self._lock:
+            segments = [segment for segment, _ in self._segments.values()]
+            self._segments.clear()
+
+        for segment in segments:
+            self._free(segment)
+
+    @staticmethod
+    def _free(segment):
+        with _attach_lock:
+            attached = _attached.pop(segment.name, None)
+            _created.discard(segment.name)
+        for mapping in (attached, segment):
+            try:
+                if mapping is not None:
+                    mapping.close()
+            except BufferError:
+                # arrays of the segment are still alive; the mapping goes with them
+                pass
+        segment.unlink()
@@ -0,0 +1,107 @@
+import json
+from importlib import import_module
+
+import numpy as np
+import pandas as pd
+
+from .guess_chromosome_labels import ChromosomeLabel
+
+# columnar formats of the exported table by name
+table_formats = {"parquet": ".parquet", "arrow": ".arrow"}
+
+# key of the run parameters in the schema metadata
+metadata_key = b"napari_kics"
+
+
+def _pyarrow():
+    try:
+        return import_module("pyarrow")
+    except ImportError:
+        raise ImportError(
+            "exporting columnar tables requires pyarrow: pip install napari-kics[arrow]"
+        )
+
+
+def has_pyarrow():
+    try:
+        _pyarrow()
+    except ImportError:
+        return False
+    else:
+        return True
+
+
+def table_columns(ids, labels, counts, areas, sizes, bboxes):
+    """Return the typed columns of the estimates table.
+
+    Chromosome labels are encoded as `major` and `minor` (-1 for labels that
+    are not `ChromosomeLabel`s) next to their display string; the bounding
+    boxes are split into four integer columns.
+    """
+    labels = list(labels)
+    majors = np.full(len(labels), -1, dtype=np.int16)
+    minors = np.full(len(labels), -1, dtype=np.int16)
+    for i, label in enumerate(labels):
+        if isinstance(label, ChromosomeLabel):
+            majors[i] = label.major
+            minors[i] = label.minor
+    bboxes = np.asarray(bboxes, dtype=np.int32).reshape(-1, 4)
+
+    return {
+        "id": np.asarray(ids, dtype=np.int64),
+        "label": pd.Categorical([str(label) for label in labels]),
+        "major": majors,
+        "minor": minors,
+        "count": np.asarray(counts, dtype=np.int32),
+        "area": np.asarray(areas, dtype=np.float64),
+        "size": np.asarray(sizes, dtype=np.float64),
+        "bbox_min_row": bboxes[:, 0],
+        "bbox_min_col": bboxes[:, 1],
+        "bbox_max_row": bboxes[:, 2],
+        "bbox_max_col": bboxes[:, 3],
+    }
+
+
+def export_table(fname, columns, metadata=None, *, table_format="parquet"):
+    """Write `columns` (see `table_columns`) as Parquet or Arrow IPC file.
+
+    `metadata` (e.g. the run parameters) is stored as JSON in the schema
+    metadata under `metadata_key`.
+    """
+    pa = _pyarrow()
+
+    table = pa.Table.from_pandas(pd.DataFrame(columns), preserve_index=False)
+    table = table.replace_schema_metadata(
+        {
+            **(table.schema.metadata or {}),
+            metadata_key: json.dumps(metadata or {}, default=str).encode(),
+        }
+    )
+
+    if table_format == "parquet":
+        import_module("pyarrow.parquet").write_table(table, fname)
+    elif table_format == "arrow":
+        with pa.OSFile(str(fname), "wb") as sink, pa.ipc.new_file(
+            sink, table.schema
+        ) as writer:
+            writer.write_table(table)
+    else:
+        raise ValueError(f"unsupported table format {table_format}")
+
+
+def read_table(fname):
+    """Read a table written by `export_table` and return it (a pyarrow
+    `Table`) together with its metadata.
+
+    Arrow IPC files are memory-mapped, so their columns are not copied.
+    """
+    pa = _pyarrow()
+
+    if str(fname).endswith(table_formats["arrow"]):
+        table = pa.ipc.open_file(pa.memory_map(str(fname), "r")).read_all()
+    else:
+        table = import_module("pyarrow.parquet").read_table(fname)
+
+    metadata = json.loads((table.schema.metadata or {}).get(metadata_key, b"{}"))
+
+    return table, metadata
@@ -1,7 +1,5 @@
 import math
 
-import numpy as np
-import pandas as pd
 from qtpy.QtWidgets import (
     QDoubleSpinBox,
     QFormLayout,
@@ -18,7 +16,7 @@ from ..analysis_plots import (
     read_tsv_data,
 )
 from ..global_signals import signals
-from ..utils import ChromosomeLabel
+from ..pipeline import chromosome_estimates
 from ..widgets import ClickableLineEdit
 
 
@@ -123,34 +121,10 @@ class AnalysisWidget(QVBoxLayout):
         if not self.table.isEnabled():
             raise Exception("Complete the above steps before comparison.")
 
-        labels = self.table.model().dataframe["label"]
-        sizes = self.table.model().dataframe["size"]
-
-        mean_acc = pd.DataFrame(
-            columns=("total_size", "count"),
-            dtype=(np.int_, np.int_),
+        model = self.table.model()
+        self.estimates = chromosome_estimates(
+            model.dataframe, self.scaffold_sizes, model.genomeSize
         )
-        for chr_label, estimate in zip(labels, sizes):
-            key = chr_label
-            if isinstance(chr_label, ChromosomeLabel):
-                key = str(chr_label.major)
-
-            if key in mean_acc.index:
-                mean_acc.loc[key] += (estimate, 1)
-            else:
-                mean_acc.loc[key] = (estimate, 1)
-
-        self.estimates = pd.Series(
-            mean_acc["total_size"] / mean_acc["count"],
-            name="chromosome_estimates",
-        )
-
-        if self.table.model().hasGenomeSize():
-            # sizes are in mega bases
-            self.estimates *= 1_000_000
-        else:
-            # sizes are in percent
-            self.estimates *= sum(self.scaffold_sizes) / 100
 
         self.analysis_result = analysis_plots(
             self.scaffold_sizes,
@@ -11,7 +11,7 @@ from qtpy.QtWidgets import (
     QSpinBox,
 )
 
-from ..utils import bbox2shape, get_img
+from ..utils import bboxes2shapes, get_img
 
 
 class AnnotationWidget(QFormLayout):
@@ -21,6 +21,10 @@ class AnnotationWidget(QFormLayout):
         self.viewer = viewer
         self.table = table
 
+        # label ids in the order of the shapes in the annotation layer
+        self.annotated_ids = None
+        self.shape_parameters = {"edge_color": "red", "edge_width": 2}
+
         self.text_parameters = {
             "text": "{size}\n{label}",
             "size": 5,
@@ -128,36 +132,118 @@ class AnnotationWidget(QFormLayout):
         if not tableModel.hasData():
             return
 
-        dataframe = tableModel.dataframe
-        nrows = tableModel.rowCount()
-        labelCol = dataframe.columns.get_loc("label")
-        sizeCol = dataframe.columns.get_loc("size")
-
-        labels = [tableModel.data(row=i, column=labelCol) for i in range(nrows)]
-        sizes = [tableModel.data(row=i, column=sizeCol) for i in range(nrows)]
-        bboxes = [bbox2shape(b) for b in dataframe.loc[:, "_bbox"]]
+        ids = tableModel.dataframe.index.to_numpy()
+        bboxes = bboxes2shapes(tableModel.bboxes())
 
-        print(
-            "[annotate] bboxes, labels and sizes have lengths",
-            f"{len(bboxes), len(labels), len(sizes)}",
-        )
-        print(f"[annotate] bboxes, labels and sizes are {bboxes, labels, sizes}")
+        print(f"[annotate] annotating {len(ids)} labels")
 
         # https://napari.org/tutorials/applications/annotate_segmentation.html
-        properties = {"label": labels, "size": sizes}
+        properties = {
+            "label": tableModel.formatColumn("label"),
+            "size": tableModel.formatColumn("size"),
+        }
+        self.shape_parameters = {"edge_color": edge_color, "edge_width": edge_width}
 
         if name in self.viewer.layers:
             annotation_layer = self.viewer.layers[name]
-            annotation_layer.data = bboxes
+            annotation_layer.data = list(bboxes)
             annotation_layer.properties = properties
             annotation_layer.refresh()
+            self.annotated_ids = ids
         elif not update_only:
             self.viewer.add_shapes(
-                bboxes,
+                list(bboxes),
                 name=name,
                 face_color="transparent",
-                edge_width=edge_width,
-                edge_color=edge_color,
                 properties=properties,
                 text=self.text_parameters,
+                **self.shape_parameters,
             )
+            self.annotated_ids = ids
+
+    def update_annotations(self, where, old, new, *, name="annotations"):
+        """Apply a change of the table model (see `sigChange`) to the annotation
+        layer by touching only the shapes of the rows named in the change."""
+        tableModel = self.table.model()
+        if (
+            not tableModel.hasData()
+            or name not in self.viewer.layers
+            or self.annotated_ids is None
+        ):
+            return
+
+        changes = new if where == "bulk" else [(where, old, new)]
+        added, removed, moved, relabelled = set(), set(), set(), set()
+        for where, old, new in changes or []:
+            if where == "dataframe":
+                # everything changed
+                self.annotate(update_only=True, name=name, **self.shape_parameters)
+                return
+            elif where == "insertRow":
+                added.add(new.name)
+            elif where == "removeRow":
+                removed.add(old.name)
+            elif isinstance(where, tuple) and where[1] == "_bbox":
+                moved.add(where[0])
+            elif isinstance(where, tuple) and where[1] == "label":
+                relabelled.add(where[0])
+            # changes of genome size, areas and counts affect all sizes which are
+            # updated unconditionally below
+
+        annotation_layer = self.viewer.layers[name]
+
+        # remove shapes of deleted labels and those that need to be redrawn
+        stale = np.isin(self.annotated_ids, list(removed | moved))
+        if stale.any():
+            self._remove_shapes(annotation_layer, np.flatnonzero(stale))
+            self.annotated_ids = self.annotated_ids[~stale]
+
+        # add shapes of new labels and redraw moved ones
+        new_ids = np.array(list((added | moved) - removed), dtype=np.int_)
+        new_rows = tableModel.rowsForIds(new_ids)
+        new_ids = new_ids[new_rows >= 0].astype(self.annotated_ids.dtype)
+        if len(new_ids) > 0:
+            new_bboxes = tableModel.bboxes(new_rows[new_rows >= 0])
+            annotation_layer.add(
+                bboxes2shapes(new_bboxes),
+                shape_type="rectangle",
+                **self.shape_parameters,
+            )
+            self.annotated_ids = np.concatenate((self.annotated_ids, new_ids))
+
+        # update text properties
+        rows = tableModel.rowsForIds(self.annotated_ids)
+        features = annotation_layer.features
+        features["size"] = tableModel.formatColumn("size", rows)
+        text_ids = np.isin(self.annotated_ids, list(relabelled))
+        text_ids[len(self.annotated_ids) - len(new_ids) :] = True
+        features.loc[text_ids, "label"] = tableModel.formatColumn(
+            "label", rows[text_ids]
+        )
+        annotation_layer.refresh_text()
+
+    @staticmethod
+    def _remove_shapes(layer, index):
+        """Remove the shapes at the (sorted) `index` from the shapes `layer`.
+
+        Unlike `remove_selected`, the selection of the user is kept (and only
+        renumbered if shapes before it were removed).
+        """
+        index = [int(i) for i in index]
+        for i in reversed(index):
+            layer._data_view.remove(i)
+        layer._feature_table.remove(index)
+        layer.text.remove(index)
+        layer._data_view._edge_color = np.delete(
+            layer._data_view._edge_color, index, axis=0
+        )
+        layer._data_view._face_color = np.delete(
+            layer._data_view._face_color, index, axis=0
+        )
+
+        selected = np.array(sorted(layer.selected_data), dtype=np.int_)
+        kept = selected[~np.isin(selected, index)]
+        kept -= np.searchsorted(index, kept)
+        if not np.array_equal(kept, selected):
+            layer.selected_data = set(kept.tolist())
+        layer.refresh()
@@ -1,6 +1,11 @@
+import os
+
+import numpy as np
 from PyQt5.QtCore import Qt
 from qtpy.QtWidgets import QScrollArea, QVBoxLayout, QWidget
 
+from ..analysis_plots.backends.pyqtgraph import ReturnType
+from ..utils.session import load_session, save_session
 from .analysis_widget import AnalysisWidget
 from .annotation_widget import AnnotationWidget
 from .head_layout import HeadLayout
@@ -50,7 +55,9 @@ class KaryotypeContentWidget(QWidget):
         self.layout.addLayout(self.label_widget)
 
         # ordering
-        self.order_widget = OrderWidget(self.viewer, self.label_widget.table)
+        self.order_widget = OrderWidget(
+            self.viewer, self.label_widget.table, self.label_widget.table_sync.flush
+        )
 
         self.layout.addLayout(self.order_widget)
 
@@ -60,7 +67,7 @@ class KaryotypeContentWidget(QWidget):
         )
         self.order_widget.sigOrderChanged.connect(self.annotation_widget.annotate)
         self.label_widget.table.model().sigChange.connect(
-            lambda where, old, new: self.annotation_widget.annotate(update_only=True)
+            self.annotation_widget.update_annotations
         )
         self.layout.addLayout(self.annotation_widget)
 
@@ -75,6 +82,8 @@ class KaryotypeContentWidget(QWidget):
             self.analysis_widget,
             self.preprocessing_widget,
         )
+        self.saving_widget.sigSaveSession.connect(self.save_session)
+        self.saving_widget.sigRestoreSession.connect(self.restore_session)
         self.layout.addLayout(self.saving_widget)
 
         self._console_populated = False
@@ -82,6 +91,92 @@ class KaryotypeContentWidget(QWidget):
             self._ensure_populate_console
         )
 
+    def save_session(self, path):
+        """Write a snapshot of the current session to `path` (see
+        `utils.session.save_session`)."""
+        model = self.label_widget.table.model()
+        if not model.hasData() or "labelled" not in self.viewer.layers:
+            raise Exception("Nothing to save. Please label the karyotype first.")
+
+        self.preprocessing_widget._assert_input_image()
+        input_layer = self.preprocessing_widget.input_layer
+        dataframe = model.dataframe
+        matching = getattr(
+            getattr(self.analysis_widget, "analysis_result", None), "matching", None
+        )
+
+        save_session(
+            path,
+            image=input_layer.data,
+            image_name=input_layer.name,
+            image_source=input_layer.source.path,
+            params={
+                "invert_image": self.preprocessing_widget.invert_image(),
+                "blur": self.preprocessing_widget.sigma(),
+                "threshold": self.preprocessing_widget.threshold(),
+            },
+            layers={
+                name: self.viewer.layers[name].data
+                for name in ("inverted", "blurred", "thresholded")
+                if name in self.viewer.layers
+            },
+            labels=self.viewer.layers["labelled"].data,
+            table={
+                "ids": dataframe.index.to_numpy(),
+                "labels": dataframe["label"].to_list(),
+                "counts": dataframe["count"].to_numpy(),
+                "areas": dataframe["area"].to_numpy(),
+                "bboxes": model.bboxes(),
+            },
+            genome_size=model.genomeSize,
+            matching=matching,
+        )
+        print(f"[save_session]: saved session to {path}")
+
+    def restore_session(self, path):
+        """Rebuild the layers, the table and the matching from the session
+        snapshot at `path` without recomputing them.
+
+        The input and intermediate images are passed to the layers as Zarr
+        arrays which load their chunks on access; only the labels, which are
+        painted in place, are read into memory.
+        """
+        session = load_session(path)
+
+        if session["image"] is not None:
+            input_layer = self.viewer.add_image(
+                session["image"], name=session["image_name"]
+            )
+        else:
+            # older sessions only refer to the input image
+            source = session["image_source"]
+            if source is None or not os.path.exists(source):
+                raise FileNotFoundError(
+                    f"the input image {source} of the session {path} does not exist"
+                )
+            [input_layer] = self.viewer.open(source, name=session["image_name"])
+
+        params = session["params"]
+        self.preprocessing_widget.restore(
+            input_layer,
+            invert_image=params["invert_image"],
+            sigma=params["blur"],
+            threshold=params["threshold"],
+            layers=session["layers"],
+        )
+        if "thresholded" in self.viewer.layers:
+            self.viewer.layers["thresholded"].visible = False
+
+        # label ids must not overflow when new labels are painted
+        labels = session["labels"][:]
+        labels = labels.astype(np.result_type(labels.dtype, np.int32))
+        self.label_widget.genome_size_input.setValue(session["genome_size"])
+        self.label_widget.show_labels(labels, table=session["table"])
+
+        if session["matching"] is not None:
+            self.analysis_widget.analysis_result = ReturnType(session["matching"])
+        print(f"[restore_session]: restored session from {path}")
+
     def _ensure_populate_console(self):
         if not self._console_populated:
             self.viewer.update_console(
@@ -1,3 +1,4 @@
+import logging
 from os import environ
 
 import numpy as np
@@ -13,10 +14,18 @@ from qtpy.QtWidgets import (
     QTableView,
     QVBoxLayout,
 )
-from skimage.measure import regionprops
 
+from .. import pipeline
 from ..models.estimates_table_model import EstimatesTableModel
-from ..utils import LabelHistoryProcessor, get_img, replace_label
+from ..utils import (
+    EditJournal,
+    EventCoalescer,
+    LabelHistoryProcessor,
+    get_img,
+    replace_label,
+)
+
+log = logging.getLogger(__name__)
 
 
 class LabelWidget(QVBoxLayout):
@@ -27,41 +36,29 @@ class LabelWidget(QVBoxLayout):
         self.make_thresholded_image = make_thresholded_image
         self.setAlignment(Qt.AlignLeft)
 
-        # the actual function
-        def label(img):
-            from scipy.ndimage import label
-
-            return label(img)[0]
+        # paint and fill events are merged into at most one table update per
+        # `kt_table_sync_latency` milliseconds (or until the mouse is released)
+        self.table_sync = EventCoalescer(
+            self.update_table,
+            latency=float(environ.get("kt_table_sync_latency", 16)),
+        )
 
         # wrapper with napari updates
         def label_wrapper(refresh=False):
+            # apply pending edits before the table is rebuilt
+            self.table_sync.flush()
+
             if not refresh:
                 if "thresholded" not in self.viewer.layers:
                     self.make_thresholded_image()
 
                 input_image = get_img("thresholded", self.viewer).data
-                labelled = label(input_image)
+                labelled = pipeline.label(input_image)
 
                 self.viewer.layers["thresholded"].visible = False
-
-                try:
-                    self.viewer.layers["labelled"].data = labelled
-                    self.viewer.layers["labelled"].visible = True
-                except KeyError:
-                    self.viewer.add_labels(labelled, name="labelled", opacity=0.7)
-                    self.label_layer = get_img("labelled", self.viewer)
-                    self.label_manager = LabelHistoryProcessor(self.label_layer)
-                    self.generate_table()
-                    self.label_layer.events.set_data.connect(
-                        lambda x: self.update_table()
-                    )
-
-            # self.label_layer = get_img("labelled", self.viewer)
-            # self.label_manager = LabelHistoryProcessor(self.label_layer)
-            # self.generate_table()
-            # self.label_layer.events.set_data.connect(lambda x: self.update_table())
-
-            self.init_table_from_layer()
+                self.show_labels(labelled)
+            else:
+                self.init_table_from_layer()
 
         # widget head label
         labeling_descr_label = QLabel(
@@ -133,29 +130,64 @@ class LabelWidget(QVBoxLayout):
 
         self.addWidget(self.table)
 
-    def init_table_from_layer(self):
+    def show_labels(self, labelled, table=None):
+        """Show `labelled` in the label layer (created on first use) and
+        initialize the table from it (see `init_table_from_layer`)."""
+        try:
+            self.viewer.layers["labelled"].data = labelled
+            self.viewer.layers["labelled"].visible = True
+        except KeyError:
+            self.viewer.add_labels(labelled, name="labelled", opacity=0.7)
+            self.label_layer = get_img("labelled", self.viewer)
+            EditJournal.attach(
+                self.label_layer,
+                max_bytes=int(environ.get("kt_history_max_bytes", 256 * 2**20)),
+            )
+            self.label_manager = LabelHistoryProcessor(self.label_layer)
+            self.generate_table(table)
+            self.label_layer.events.set_data.connect(self.table_sync)
+            # after the journal has recorded the edit
+            self.label_layer.events.paint.connect(self.table_sync, position="last")
+            self.label_layer.mouse_drag_callbacks.append(
+                self.table_sync.flush_on_release
+            )
+        else:
+            self.init_table_from_layer(table)
+
+    def init_table_from_layer(self, table=None):
         """Initialize the label table with the data from the label layer
-        (apply regionprops to layer.data)"""
-
-        rp = regionprops(self.label_layer.data)
-
-        res = np.array(
-            [(r.label, r.area, r.bbox) for r in rp],
-            dtype=object,
-        )
-        res = np.array(sorted(res, key=lambda x: x[0]))
+        (count the occupancy of the labels in layer.data)
+
+        If `table` is given, its columns (see `utils.session.table_columns`)
+        are used instead of the counted areas and bounding boxes.
+        """
+
+        self.label_manager.reset()
+        if table is not None:
+            self.table.model().initData(
+                ids=table["ids"],
+                labels=table["labels"],
+                counts=table["counts"],
+                areas=table["areas"],
+                bboxes=[tuple(bbox) for bbox in table["bboxes"].tolist()],
+                genomeSize=self.genome_size_input.value(),
+            )
+            return
+
+        occupancy = self.label_manager.occupancy
+        ids = occupancy.labels()
 
         self.table.model().initData(
-            ids=res[:, 0],
-            labels=[str(label) for label in res[:, 0]],
-            areas=res[:, 1],
-            bboxes=res[:, 2],
+            ids=ids,
+            labels=[str(label) for label in ids],
+            areas=np.array([occupancy.area(label) for label in ids], dtype=np.float64),
+            bboxes=[occupancy.bbox(label) for label in ids],
             genomeSize=self.genome_size_input.value(),
         )
 
-    def generate_table(self):
+    def generate_table(self, table=None):
 
-        self.init_table_from_layer()
+        self.init_table_from_layer(table)
         self.table.sortByColumn(
             EstimatesTableModel.columns.get_loc("area"), Qt.DescendingOrder
         )
@@ -173,9 +205,9 @@ class LabelWidget(QVBoxLayout):
         def sync_selection_viewer2table(e):
             sl = self.label_layer.selected_label
 
-            if sl in self.table.model().dataframe.index:
-                ind = self.table.model().dataframe.index.get_loc(sl)
-                self.table.selectRow(ind)
+            [row] = self.table.model().rowsForIds([sl])
+            if row >= 0:
+                self.table.selectRow(row)
 
         self.label_layer.events.selected_label.connect(sync_selection_viewer2table)
 
@@ -189,59 +221,58 @@ class LabelWidget(QVBoxLayout):
 
     def update_table(self):
         recent_changes = self.label_manager.recent_changes()
-        print(f"[update_table] recent_changes is {recent_changes}")
-
-        with self.table.model().bulkChanges() as bulkChanges:
-            for label, change in recent_changes.items():
-                if label == 0:
-                    # ignore background label
-                    continue
-
-                if not (label in self.table.model().dataframe.index):
-                    print(f"label {label} is not in the dataframe")
+        log.debug("recent changes: %s", recent_changes)
+
+        # ignore background label
+        recent_changes.pop(0, None)
+        if len(recent_changes) == 0:
+            return
+
+        model = self.table.model()
+        occupancy = self.label_manager.occupancy
+        labels = np.fromiter(recent_changes, dtype=np.int_, count=len(recent_changes))
+        rows = model.rowsForIds(labels)
+        areas = model.dataframe["area"].to_numpy()
+        bboxes = model.dataframe["_bbox"].to_numpy()
+
+        changed_area = {}
+        changed_bbox = {}
+        removed = []
+        with model.bulkChanges() as bulkChanges:
+            for label, row in zip(labels.tolist(), rows.tolist()):
+                # area and bbox are re-derived from the occupancy histograms
+                bbox = occupancy.bbox(label)
+                area = occupancy.area(label)
+
+                if row < 0:
+                    if bbox is None:
+                        continue
+                    log.debug("label %s is not in the dataframe", label)
                     bulkChanges.insertRow(
                         id=label,
-                        area=change.area_diff,
-                        bbox=change.bbox(),
-                    )
-                    print(f"now it is \n{self.table.model().dataframe}")
-
-                elif change.area_diff != 0:
-                    # TODO use setData instead
-                    curr_value = self.table.model().dataframe.loc[label, "area"]
-                    row = self.table.model().dataframe.index.get_loc(label)
-                    column = self.table.model().dataframe.columns.get_loc("area")
-                    self.table.model().setData(
-                        None, curr_value + change.area_diff, row=row, column=column
+                        area=area,
+                        bbox=bbox,
                     )
 
-                    if change.area_diff > 0:
-                        # label area was extended
-                        bulkChanges.setData(
-                            value=change.bbox(
-                                self.table.model().dataframe.loc[label, "_bbox"]
-                            ),
-                            row=self.table.model().dataframe.index.get_loc(label),
-                            column=EstimatesTableModel.columns.get_loc("_bbox"),
-                        )
-
-                    elif self.table.model().dataframe.at[label, "area"] > 0:
-                        # label area was reduced but still exists
-                        new_coords = np.argwhere(self.label_layer.data == label)
-                        new_bbox = (
-                            *np.amin(new_coords, axis=0),
-                            *np.amax(new_coords, axis=0),
-                        )
-
-                        bulkChanges.setData(
-                            value=new_bbox,
-                            row=self.table.model().dataframe.index.get_loc(label),
-                            column=EstimatesTableModel.columns.get_loc("_bbox"),
-                        )
-                    else:
-                        # label area was reduced completely
-                        bulkChanges.removeRow(label)
-                        print(f"label {label} was removed")
+                elif bbox is None:
+                    # label area was reduced completely
+                    removed.append(label)
+
+                else:
+                    if area != areas[row]:
+                        changed_area[label] = area
+                    if bbox != tuple(bboxes[row]):
+                        changed_bbox[label] = bbox
+
+            if changed_area:
+                model.setColumn("area", list(changed_area), list(changed_area.values()))
+            if changed_bbox:
+                model.setColumn(
+                    "_bbox", list(changed_bbox), list(changed_bbox.values())
+                )
+            for label in removed:
+                bulkChanges.removeRow(label)
+                log.debug("label %s was removed", label)
 
         self.table.update()
         # self.table.model()._updateSizeColumn()
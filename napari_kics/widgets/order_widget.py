@@ -1,29 +1,47 @@
-from math import hypot
+from os import environ
 
 import numpy as np
 from qtpy import QtCore
 from qtpy.QtCore import Qt
-from qtpy.QtWidgets import QHBoxLayout, QLabel, QPushButton, QVBoxLayout
-from skimage.measure import regionprops
+from qtpy.QtWidgets import (
+    QFormLayout,
+    QHBoxLayout,
+    QLabel,
+    QPushButton,
+    QSpinBox,
+    QVBoxLayout,
+)
 
 from ..models.estimates_table_model import EstimatesTableModel
-from ..utils import ChromosomeLabel, get_img, guess_chromosome_labels, replace_label
+from ..utils import (
+    ChromosomeLabel,
+    EditJournal,
+    LookupArray,
+    OrderAction,
+    get_img,
+    guess_chromosome_labels,
+    labels_on_line,
+)
 
 
 class OrderWidget(QVBoxLayout):
     sigOrderChanged = QtCore.Signal()
 
-    def __init__(self, viewer, table):
+    def __init__(self, viewer, table, sync_table=None):
         super().__init__()
 
         # basic state
         self.viewer = viewer
         self.table = table
+        # applies label edits still pending for the table (see `LabelWidget`)
+        self.sync_table = sync_table
 
         # list to store the reordering sequence
         self.order = []
         self.order_new = []
         self.order_layer = None
+        self.order_journal = None
+        self.order_reader = None
 
         # button configuration
         self.guess_order_button = QPushButton("Automatically guess order")
@@ -44,79 +62,74 @@ class OrderWidget(QVBoxLayout):
         self.buttons_container.addWidget(self.guess_order_button)
         self.buttons_container.addWidget(self.manual_order_button)
 
+        # ploidy used for automatic grouping (0 = group by gaps)
+        self.ploidy_input = QSpinBox()
+        self.ploidy_input.setRange(0, 16)
+        self.ploidy_input.setSpecialValueText("auto")
+        self.ploidy_input.setToolTip(
+            "Expected number of chromosomes per group; "
+            "auto groups neighbours by the gaps between them."
+        )
+        if "kt_ploidy" in environ:
+            self.ploidy_input.setValue(int(environ["kt_ploidy"]))
+        self.ploidy_input.setFixedWidth(200)
+
+        self.options_form = QFormLayout()
+        self.options_form.addRow(QLabel("- ploidy:"), self.ploidy_input)
+        self.options_form.setLabelAlignment(Qt.AlignLeft)
+        self.options_form.setFormAlignment(Qt.AlignLeft)
+
         # description label
         self.descr_label = QLabel("3. Adjust the label order:")
 
         # layout
         self.addWidget(self.descr_label)
+        self.addLayout(self.options_form)
         self.addLayout(self.buttons_container)
         self.setSpacing(5)
 
     def guess_chromosome_labels(self):
         print("[guess_chromosome_labels]: guessing...")
-        self.label_layer = get_img("labelled", self.viewer)
-        props = regionprops(self.label_layer.data)
-        bounding_boxes = [rp.bbox for rp in props]
-        img_labels = [rp.label for rp in props]
+        # the bounding boxes are kept up-to-date by the table model once the
+        # pending label edits are applied
+        if self.sync_table is not None:
+            self.sync_table()
+        model = self.table.model()
+        img_labels = model.dataframe.index.to_numpy()
+        ploidy = self.ploidy_input.value() or None
         try:
-            chr_labels = guess_chromosome_labels(bounding_boxes)
+            chr_labels = guess_chromosome_labels(
+                model.bboxes(),
+                ploidy=ploidy,
+                areas=model.dataframe["area"].to_numpy(),
+            )
         except Exception as e:
             raise Exception(f"Guessing chromosome labels failed: {e}")
 
-        get_row_index = self.table.model().dataframe.index.get_loc
-        label_col = EstimatesTableModel.columns.get_loc("label")
-        with self.table.model().bulkChanges() as bulkChanges:
-            for img_label, chr_label in zip(img_labels, chr_labels):
-                label_row = get_row_index(img_label)
-                bulkChanges.setData(value=chr_label, row=label_row, column=label_col)
+        model.setColumn("label", img_labels, chr_labels)
 
         self.table.update()
         self.sort_table_by_label()
         self.sigOrderChanged.emit()
         print("[guess_chromosome_labels]: success")
 
-    def order_drag_callback(self, label_layer, event):
-        """label layer drag callback to remove the labels that have been
-        crossed-out (added to the self.order list)"""
+    def order_drag_callback(self, order_layer, event):
+        """ordering layer drag callback to mark the labels that have been
+        crossed-out as ordered (recorded as one undoable step per stroke)"""
 
         print("[drag_callback]: drag started")
-        curr_order = []
-
-        def maybe_add_label_at(position):
-            position = np.array(position, dtype=np.int_)
-
-            if not ((0 < position) & (position < label_layer.data.shape)).all():
-                # position out of bounds
-                return
-
-            y, x = position
-            curr_label = label_layer.data[y, x]
-
-            if (
-                curr_label != 0
-                and curr_label is not None
-                and (len(curr_order) == 0 or curr_order[-1] != curr_label)
-            ):
-                print(f"[drag_callback]: removing {curr_label} marked at {position}")
-                replace_label(label_layer, curr_label, 0)
-                curr_order.append(curr_label)
+        labels = self.label_layer.data
+        group = len(self.order_new)
+        self.order_journal.begin_step()
 
         def add_labels_on_line(from_pos, to_pos):
-            # vector pointing from from_pos to to_pos
-            delta = (to_pos[0] - from_pos[0], to_pos[1] - from_pos[1])
-            # increment vector that has unit length
-            increment = (
-                delta[0] / hypot(*delta),
-                delta[1] / hypot(*delta),
-            )
+            crossed = labels_on_line(labels, from_pos, to_pos)
+            new_labels = crossed[~self.is_ordered(crossed)]
 
-            # while delta and increment point in the same direction
-            while delta[0] * increment[0] + delta[1] * increment[1] > 0:
-                # see if we find a new label
-                maybe_add_label_at(from_pos)
-                # move one step further
-                from_pos = (from_pos[0] + increment[0], from_pos[1] + increment[1])
-                delta = (to_pos[0] - from_pos[0], to_pos[1] - from_pos[1])
+            if len(new_labels) > 0:
+                print(f"[drag_callback]: ordering {new_labels}")
+                self.order_journal.record(OrderAction(new_labels, group))
+                self.sync_order()
 
         yield
 
@@ -124,77 +137,107 @@ class OrderWidget(QVBoxLayout):
             if "Shift" in event.modifiers:
                 if event.last_event is not None:
                     add_labels_on_line(event.last_event.position, event.position)
-                maybe_add_label_at(event.position)
+                else:
+                    add_labels_on_line(event.position, event.position)
             yield
 
-        print(f"[drag_callback]: curr order is {curr_order}")
-        if len(curr_order) > 0:
-            self.order_new.append(curr_order)
+        self.order_journal.end_step()
+        print(f"[drag_callback]: order is {self.order_new}")
 
-    def parse_recent_step(self, label_layer):
-        """a function to parse the recent history step to extract the recent
-        changes in the label layer"""
+    def sync_order(self):
+        """apply the ordering actions recorded, undone or redone since the
+        last call to the order lists and the overlay"""
 
-        print("parse recent step")
+        for action, direction in self.order_reader.read():
+            labels = action.labels.tolist()
+            if direction > 0:
+                if action.group == len(self.order_new):
+                    self.order_new.append([])
+                self.order_new[action.group].extend(labels)
+                self.order.extend(labels)
+            else:
+                del self.order_new[action.group][-len(labels) :]
+                if len(self.order_new[action.group]) == 0:
+                    self.order_new.pop(action.group)
+                del self.order[-len(labels) :]
+            self.mark_ordered(action.labels, ordered=direction > 0)
 
-        print(f"undo history\n {label_layer._undo_history}")
-        print(f"redo history\n {label_layer._redo_history}")
+    def is_ordered(self, labels):
+        """vectorized check whether `labels` are marked as ordered"""
 
-        if len(label_layer._undo_history) != 0:
-            recent_step = label_layer._undo_history[-1][-1]
-            label = recent_step[1][0]
+        labels = np.asarray(labels)
+        ordered = np.zeros(labels.shape, dtype=np.bool_)
+        inside = labels < len(self.ordered_lut)
+        ordered[inside] = self.ordered_lut[labels[inside]] != 0
 
-            if label not in self.order:
-                self.order.append(label)
-            else:
-                recent_step = label_layer._redo_history[-1][-1]
-                label = recent_step[1][0]
-                self.order.remove(label)
+        return ordered
 
-                # order new
-                last_list = self.order_new[-1]
-                last_list.remove(label)
-                if len(last_list) == 0:
-                    self.order_new.pop(-1)
+    def mark_ordered(self, labels, ordered=True):
+        """mark `labels` as (not) ordered in the overlay"""
 
-        else:
-            recent_step = self.label_layer._redo_history[-1][-1]
-            label = recent_step[1][0]
-            self.order.remove(label)
+        labels = np.atleast_1d(labels)
+        max_label = labels.max()
+        if max_label >= len(self.ordered_lut) - 1:
+            # grow the lookup table (keeping a trailing zero)
+            lut = np.zeros(2 * max_label + 2, dtype=self.ordered_lut.dtype)
+            lut[: len(self.ordered_lut)] = self.ordered_lut
+            self.ordered_lut = lut
+            self.order_layer.data = LookupArray(self.label_layer.data, lut)
+
+        self.ordered_lut[labels] = 1 if ordered else 0
+        self.order_layer.refresh()
+
+    def undo_last_ordered(self, order_layer=None):
+        """remove the most recent stroke from the order"""
 
-            # order new
-            last_list = self.order_new[-1]
-            last_list.remove(label)
-            if len(last_list) == 0:
-                self.order_new.pop(-1)
+        self.order_journal.undo()
+        self.sync_order()
+        print(f"[undo_last_ordered]: order is {self.order}")
 
-        print(f"recent label: {label}")
-        print(f"order: {self.order}")
-        print(f"order_new: {self.order_new}")
+    def redo_last_ordered(self, order_layer=None):
+        """restore the most recently undone stroke"""
+
+        self.order_journal.redo()
+        self.sync_order()
+        print(f"[redo_last_ordered]: order is {self.order}")
 
     def activate_ordering_mode(self):
-        """create the new label layer and allow relabelling"""
+        """add the ordering overlay and allow relabelling"""
 
         self.label_layer = get_img("labelled", self.viewer)
         self.order.clear()
+        self.order_new.clear()
+
+        # ordering actions are journaled so that they can be undone and redone
+        self.order_journal = EditJournal()
+        self.order_reader = self.order_journal.subscribe()
 
-        # make all the existing layers invisible
+        # hide all other layers but the labels
         self.visible_layers = set()
         for layer in self.viewer.layers:
-            if layer.visible:
+            if layer.visible and layer is not self.label_layer:
                 self.visible_layers.add(layer)
                 layer.visible = False
 
-        # add a new auxiliary ordering layer
+        # ordered labels are looked up from a small per-label table instead of
+        # copying the label image (it grows when larger labels are ordered)
+        model = self.table.model()
+        ids = model.dataframe.index if model.hasData() else []
+        max_label = int(ids.max()) if len(ids) > 0 else 0
+        self.ordered_lut = np.zeros(max_label + 2, dtype=np.uint8)
+
+        # add a new auxiliary ordering layer that shades the ordered labels
         self.order_layer = self.viewer.add_labels(
-            self.label_layer.data.copy(), name="ordering"
+            LookupArray(self.label_layer.data, self.ordered_lut),
+            name="ordering",
+            color={1: "black"},
+            opacity=0.8,
         )
         self.order_layer.editable = False
         self.order_layer.mouse_drag_callbacks.append(self.order_drag_callback)
-
-        # attach the event listener
-        self.order_layer.events.set_data.connect(
-            lambda x: self.parse_recent_step(self.order_layer)
+        self.order_layer.bind_key("Control-Z", self.undo_last_ordered, overwrite=True)
+        self.order_layer.bind_key(
+            "Control-Shift-Z", self.redo_last_ordered, overwrite=True
         )
 
     def deactivate_ordering_mode(self):
@@ -205,6 +248,9 @@ class OrderWidget(QVBoxLayout):
         ind = self.viewer.layers.index(self.order_layer)
         self.viewer.layers.pop(ind)
         self.order_layer = None
+        self.ordered_lut = None
+        self.order_journal = None
+        self.order_reader = None
 
         # make other layers visible
         for layer in self.visible_layers:
@@ -215,29 +261,18 @@ class OrderWidget(QVBoxLayout):
 
         if len(self.order) > 0:
             print("relabelling")
-
-            get_row_index = self.table.model().dataframe.index.get_loc
-            label_col = EstimatesTableModel.columns.get_loc("label")
-            with self.table.model().bulkChanges() as bulkChanges:
-                for ind, label_list in enumerate(self.order_new):
-                    for subind, label in enumerate(label_list):
-                        chr_label = ChromosomeLabel(ind + 1, subind, None, None)
-                        label_row = get_row_index(label)
-                        bulkChanges.setData(
-                            value=chr_label, row=label_row, column=label_col
-                        )
-
-                unprocessed_labels = (
-                    set(list(self.table.model().dataframe.index))
-                    - set(self.order)
-                    - {0}
-                )
-
-                for label in unprocessed_labels:
-                    label_row = get_row_index(label)
-                    bulkChanges.setData(
-                        value="unassigned", row=label_row, column=label_col
-                    )
+            if self.sync_table is not None:
+                self.sync_table()
+
+            model = self.table.model()
+            ids = model.dataframe.index.to_numpy()
+            chr_labels = np.full(len(ids), "unassigned", dtype=object)
+            for ind, label_list in enumerate(self.order_new):
+                rows = model.rowsForIds(label_list)
+                for subind, row in enumerate(rows.tolist()):
+                    if row >= 0:
+                        chr_labels[row] = ChromosomeLabel(ind + 1, subind, None, None)
+            model.setColumn("label", ids, chr_labels)
 
         self.order = []
         self.order_new = []
@@ -1,11 +1,21 @@
 from math import sqrt
 from os import environ
 
-from qtpy.QtCore import Qt
-from qtpy.QtWidgets import QCheckBox, QFormLayout, QLabel, QVBoxLayout
-from skimage.color import rgb2gray, rgba2rgb
-from skimage.filters import gaussian
-
+import numpy as np
+from napari.qt.threading import create_worker
+from qtpy.QtCore import QSignalBlocker, Qt
+from qtpy.QtWidgets import (
+    QCheckBox,
+    QFormLayout,
+    QHBoxLayout,
+    QLabel,
+    QPushButton,
+    QSpinBox,
+    QVBoxLayout,
+)
+
+from ..autotune import autotune
+from ..pipeline import apply_blur, apply_invert, apply_threshold, to_gray
 from .input_double_slider import InputDoubleSlider
 
 
@@ -77,6 +87,28 @@ class PreprocessingWidget(QVBoxLayout):
         blur_label.setAlignment(Qt.AlignmentFlag.AlignLeft)
         options_layout.addRow(blur_label, self.sigma_slider)
 
+        # automatic search of the above parameters
+        self.expected_count_input = QSpinBox()
+        self.expected_count_input.setRange(1, 1000)
+        self.expected_count_input.setValue(int(environ.get("kt_expected_count", 46)))
+        self.expected_count_input.setToolTip(
+            "Expected number of chromosomes used to score the parameters."
+        )
+        self.autotune_btn = QPushButton("Auto-tune")
+        self.autotune_btn.setToolTip(
+            "Search the invert, threshold and blur settings that segment the "
+            "expected number of chromosomes best and apply them."
+        )
+        self.autotune_btn.clicked.connect(lambda _: self.apply_autotune())
+        self.autotune_results = None
+
+        autotune_layout = QHBoxLayout()
+        autotune_layout.addWidget(self.expected_count_input)
+        autotune_layout.addWidget(self.autotune_btn)
+        autotune_label = QLabel("- expected count:")
+        autotune_label.setAlignment(Qt.AlignmentFlag.AlignLeft)
+        options_layout.addRow(autotune_label, autotune_layout)
+
         options_layout.setLabelAlignment(Qt.AlignmentFlag.AlignLeft)
 
         self.addLayout(options_layout)
@@ -98,47 +130,34 @@ class PreprocessingWidget(QVBoxLayout):
         return self.threshold_slider.value()
 
     def _assert_input_image(self, force_update=False):
-        if force_update or self.input_image is None:
+        if force_update or self.input_layer is None:
             if self.viewer.layers.selection.active is None:
                 raise Exception(
                     "No available images found. Please import a karyotype first."
                 )
 
-            self.input_layer = self.viewer.layers.selection.active
-            self.input_image = self._to_gray(self.input_layer.data)
-            self.last_sigma = None
-            self.last_threshold = None
-            self.last_invert_image = None
-            self.viewer.layers.events.removed.connect(
-                lambda e: self.reset_input_layer()
-                if e.value == self.input_layer
-                else print(f"removed layer {e.value.name} at {e.index}")
-            )
+            self._set_input_layer(self.viewer.layers.selection.active)
+
+        if self.input_image is None:
+            # read on first use (restored layers are loaded lazily)
+            self.input_image = to_gray(self.input_layer.data)
+
+    def _set_input_layer(self, input_layer):
+        self.input_layer = input_layer
+        self.input_image = None
+        self.last_sigma = None
+        self.last_threshold = None
+        self.last_invert_image = None
+        self.viewer.layers.events.removed.connect(
+            lambda e: self.reset_input_layer()
+            if e.value == self.input_layer
+            else print(f"removed layer {e.value.name} at {e.index}")
+        )
 
     def reset_input_layer(self):
         self.input_layer = None
         self.input_image = None
 
-    @staticmethod
-    def _to_gray(img):
-        if len(img.shape) == 3 and img.shape[-1] == 4:
-            return rgb2gray(rgba2rgb(img))
-        elif len(img.shape) == 3 and img.shape[-1] == 3:
-            return rgb2gray(img)
-        elif (
-            (len(img.shape) == 3 and img.shape[-1] == 1) or (len(img.shape) == 2)
-        ) and img.dtype.kind in "uif":
-            if img.dtype.kind in "ui":
-                return img / 255.0
-            elif img.dtype.kind == "f":
-                return img
-            else:
-                assert False, "unreachable"
-        else:
-            raise Exception(
-                f"Cannot process image with type {img.dtype} and shape {img.shape}."
-            )
-
     def _apply_invert(self):
         self._assert_input_image()
 
@@ -150,10 +169,7 @@ class PreprocessingWidget(QVBoxLayout):
 
         print(f"[PreprocessingWidget] applying invert (invert={self.invert_image()})")
 
-        if self.invert_image():
-            inverted_image = 1 - self.input_image
-        else:
-            inverted_image = self.input_image
+        inverted_image = apply_invert(self.input_image, self.invert_image())
 
         try:
             self.viewer.layers[self.inverted_opts["name"]].data = inverted_image
@@ -172,8 +188,8 @@ class PreprocessingWidget(QVBoxLayout):
             return
 
         print(f"[PreprocessingWdget] applying blur (sigma={self.sigma()})")
-        inverted_image = self.viewer.layers[self.inverted_opts["name"]].data
-        blurred_img = gaussian(inverted_image, self.sigma())
+        inverted_image = np.asarray(self.viewer.layers[self.inverted_opts["name"]].data)
+        blurred_img = apply_blur(inverted_image, self.sigma())
 
         try:
             self.viewer.layers[self.blurred_opts["name"]].data = blurred_img
@@ -196,8 +212,8 @@ class PreprocessingWidget(QVBoxLayout):
         print(
             f"[PreprocessingWidget] applying threshold (threshold={self.threshold()})"
         )
-        blurred_img = self.viewer.layers[self.blurred_opts["name"]].data
-        thresholded_img = (blurred_img < 1 - self.threshold()).astype(int)
+        blurred_img = np.asarray(self.viewer.layers[self.blurred_opts["name"]].data)
+        thresholded_img = apply_threshold(blurred_img, self.threshold())
 
         try:
             self.viewer.layers[self.thresholded_opts["name"]].data = thresholded_img
@@ -212,5 +228,84 @@ class PreprocessingWidget(QVBoxLayout):
         except ValueError:
             pass
 
+    def set_params(self, invert_image, sigma, threshold):
+        """Set the parameters without triggering the preprocessing."""
+        for widget, value in (
+            (self.invert_option, invert_image),
+            (self.sigma_slider, sigma),
+            (self.threshold_slider, threshold),
+        ):
+            blocker = QSignalBlocker(widget)
+            if widget is self.invert_option:
+                widget.setChecked(value)
+            else:
+                widget.setValue(value)
+            blocker.unblock()
+
+    def apply_autotune(self):
+        """Search the parameters (see `autotune`) for the input image in a
+        background thread and apply the best ones once it is done.
+
+        Returns the (started) worker.
+        """
+        self._assert_input_image()
+
+        print("[PreprocessingWidget] auto-tuning ...")
+        # no napari progress bar: adding one processes the pending events in a
+        # loop that can starve while the worker processes keep the CPUs busy
+        label = self.autotune_btn.text()
+
+        def on_finished():
+            self.autotune_btn.setText(label)
+            self.autotune_btn.setEnabled(True)
+
+        worker = create_worker(
+            autotune,
+            self.input_image,
+            self.expected_count_input.value(),
+            jobs=int(environ["kt_jobs"]) if "kt_jobs" in environ else None,
+        )
+        worker.returned.connect(self._apply_autotune_results)
+        worker.finished.connect(on_finished)
+        self.autotune_btn.setText("Auto-tuning ...")
+        self.autotune_btn.setEnabled(False)
+        worker.start()
+
+        return worker
+
+    def _apply_autotune_results(self, results):
+        self.autotune_results = results
+        best = results.iloc[0]
+        print(f"[PreprocessingWidget] best candidates:\n{results[:5]}")
+
+        self.set_params(
+            bool(best["invert_image"]), float(best["blur"]), float(best["threshold"])
+        )
+        self.preprocess()
+
+    def restore(self, input_layer, invert_image, sigma, threshold, layers):
+        """Restore the parameters and the intermediate images `layers` (by
+        name) computed from `input_layer` without recomputing them.
+
+        The images may be lazily loaded arrays (e.g. Zarr arrays); they are
+        only read when they are used.
+        """
+        self.set_params(invert_image, sigma, threshold)
+
+        self.viewer.layers.selection.active = input_layer
+        self._set_input_layer(input_layer)
+
+        for opts in (self.inverted_opts, self.blurred_opts, self.thresholded_opts):
+            if opts["name"] not in layers:
+                continue
+            try:
+                self.viewer.layers[opts["name"]].data = layers[opts["name"]]
+            except KeyError:
+                self.viewer.add_image(layers[opts["name"]], **opts)
+
+        self.last_invert_image = invert_image if "inverted" in layers else None
+        self.last_sigma = sigma if "blurred" in layers else None
+        self.last_threshold = threshold if "thresholded" in layers else None
+
     def preprocess(self):
         self._apply_threshold()
@@ -1,13 +1,40 @@
-import pandas as pd
+import os
+import uuid
+import weakref
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+from napari.qt.threading import create_worker
 from napari.utils import progress
-from qtpy.QtWidgets import QLabel, QPushButton, QVBoxLayout
-from skimage import io
+from qtpy import QtCore
+from qtpy.QtWidgets import QHBoxLayout, QLabel, QPushButton, QVBoxLayout
 
-from ..utils.export_annotated_karyotype import export_svg
+from .. import pipeline
+from ..utils import EditJournal, colorize_labels
+from ..utils.image_io import image_formats
+from ..utils.manifest import Manifest, content_hash
+from ..utils.table_export import has_pyarrow, table_formats
 from ..widgets import ClickableLineEdit
 
 
 class SavingWidget(QVBoxLayout):
+    # emitted with the path of the session to save or restore
+    sigSaveSession = QtCore.Signal(str)
+    sigRestoreSession = QtCore.Signal(str)
+
+    session_fname = "session.zarr"
+
+    # writers of the artifacts (besides the screenshot), run concurrently
+    artifacts = (
+        "_save_images",
+        "_save_params",
+        "_save_table",
+        "_save_table_columnar",
+        "_save_matching",
+        "_save_annotated_karyotype",
+        "_save_annotated_png",
+    )
+
     def __init__(self, viewer, table, analysis_widget, preprocessing_widget):
         super().__init__()
 
@@ -15,6 +42,31 @@ class SavingWidget(QVBoxLayout):
         self.table = table
         self.analysis_widget = analysis_widget
         self.preprocessing_widget = preprocessing_widget
+        # id -> (weak reference, token) of the objects seen by `_token`
+        self._tokens = {}
+        # input -> (revision, content hash) of the last save (see `_input_hashes`)
+        self._hashes = {}
+
+        # output format of the intermediate and label images (see `_save_images`)
+        self.image_format = os.environ.get("kt_image_format", "png")
+        if self.image_format not in image_formats:
+            raise ValueError(f"unsupported image format {self.image_format}")
+
+        # columnar export of the table next to data.csv (requires pyarrow)
+        self.table_format = os.environ.get("kt_table_format", "parquet")
+        if self.table_format not in table_formats:
+            raise ValueError(f"unsupported table format {self.table_format}")
+
+        # options of the embedded karyotype in the annotated SVG
+        self.svg_options = {}
+        if "kt_svg_oversampling" in os.environ:
+            self.svg_options["oversampling"] = float(os.environ["kt_svg_oversampling"])
+        if "kt_svg_image_format" in os.environ:
+            self.svg_options["image_format"] = os.environ["kt_svg_image_format"]
+        if "kt_svg_external_image" in os.environ:
+            self.svg_options["external_image"] = os.environ[
+                "kt_svg_external_image"
+            ] not in ("", "0")
 
         self.save_path_line_edit = ClickableLineEdit(
             placeholderText="Select output directory", mode="directory"
@@ -23,11 +75,26 @@ class SavingWidget(QVBoxLayout):
         self.save_btn = QPushButton("Save")
         self.save_btn.clicked.connect(self.onClick)
 
+        self.save_session_btn = QPushButton("Save session")
+        self.save_session_btn.clicked.connect(
+            lambda e: self.onSessionClick(self.sigSaveSession)
+        )
+
+        self.restore_session_btn = QPushButton("Restore session")
+        self.restore_session_btn.clicked.connect(
+            lambda e: self.onSessionClick(self.sigRestoreSession)
+        )
+
+        self.session_buttons = QHBoxLayout()
+        self.session_buttons.addWidget(self.save_session_btn)
+        self.session_buttons.addWidget(self.restore_session_btn)
+
         self.descr_label = QLabel("6. Save results to the the following directory:")
 
         self.addWidget(self.descr_label)
         self.addWidget(self.save_path_line_edit)
         self.addWidget(self.save_btn)
+        self.addLayout(self.session_buttons)
         self.setSpacing(5)
 
     def onClick(self, event):
@@ -37,82 +104,324 @@ class SavingWidget(QVBoxLayout):
         ):
             self.save_output(self.save_path_line_edit.text())
 
-    def save_output(self, path):
+    def onSessionClick(self, signal):
+        if (
+            len(self.save_path_line_edit.text()) > 0
+            or self.save_path_line_edit.showDialog()
+        ):
+            signal.emit(
+                os.path.join(self.save_path_line_edit.text(), self.session_fname)
+            )
+
+    def save_output(self, path, *, force=False):
+        """Write all artifacts to `path` in a background thread and return the
+        (started) worker.
+
+        The inputs of the artifacts are collected on the main thread first
+        (see `_snapshot`), so the writers never touch the widgets. Artifacts
+        whose inputs did not change since they were last written (see
+        `_input_hashes`) are skipped unless `force` is set.
+        """
         if len(path) == 0:
             path = "."
 
-        for method in progress(
-            (
-                "_save_images",
-                "_save_params",
-                "_save_table",
-                "_save_matching",
-                "_save_screenshot",
-                "_save_annotated_karyotype",
-            )
-        ):
-            getattr(self, method)(path)
-
-    def _save_images(self, path):
-        for name in ("inverted", "blurred", "thresholded", "labelled"):
-            if name in self.viewer.layers:
-                layer = self.viewer.layers[name]
-                img = layer.data
-                if name == "labelled":
-                    # save exact labels
-                    io.imsave(f"{path}/{name}.tiff", img, check_contrast=False)
-                    # save visual labels
-                    io.imsave(f"{path}/{name}_color.png", layer.get_color(list(img)))
-                else:
-                    io.imsave(f"{path}/{name}.png", img)
-
-    def _save_params(self, path):
-        params = pd.Series(
-            {
-                "invert_image": self.preprocessing_widget.invert_image(),
-                "threshold": self.preprocessing_widget.threshold(),
-                "blur": self.preprocessing_widget.sigma(),
-                "genome_size": self.table.model().genomeSize,
+        snapshot = self._snapshot()
+        # the screenshot has to be taken on the main thread
+        self._save_screenshot(path)
+
+        # the progress bar is created before the worker starts and only
+        # updated through the worker's signals
+        pbar = progress(total=len(self.artifacts), desc="Saving")
+
+        def on_yielded(method):
+            pbar.set_description(method)
+            pbar.update(1)
+
+        def on_finished():
+            pbar.close()
+            self.save_btn.setEnabled(True)
+
+        worker = create_worker(self._save_artifacts, path, snapshot, force)
+        worker.yielded.connect(on_yielded)
+        worker.finished.connect(on_finished)
+        self.save_btn.setEnabled(False)
+        worker.start()
+
+        return worker
+
+    def _save_artifacts(self, path, snapshot, force):
+        """Write the `artifacts` concurrently, yielding the name of each one
+        that is done."""
+        manifest = Manifest(path)
+        hashes = self._input_hashes(snapshot)
+
+        pending = {}
+        for method in self.artifacts:
+            inputs, files = self._artifact_inputs(method, snapshot, hashes)
+            inputs_hash = content_hash(method, inputs)
+            if force or not manifest.is_current(method, inputs_hash):
+                pending[method] = (inputs_hash, files)
+            else:
+                print(f"[save_output]: {method} is up-to-date")
+                yield method
+
+        errors = []
+        with ThreadPoolExecutor(
+            max_workers=max(1, min(len(pending), os.cpu_count() or 1))
+        ) as executor:
+            futures = {
+                executor.submit(getattr(self, method), path, snapshot): method
+                for method in pending
             }
+
+            for future in as_completed(futures):
+                method = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    errors.append(e)
+                else:
+                    manifest.update(method, *pending[method])
+                yield method
+
+        # keep track of the artifacts written successfully
+        manifest.save()
+        if len(errors) > 0:
+            raise errors[0]
+
+    def _snapshot(self):
+        """Collect the inputs of all artifacts as plain data."""
+        model = self.table.model()
+        layers = self.viewer.layers
+
+        images = {
+            name: layers[name].data
+            for name in ("inverted", "blurred", "thresholded", "labelled")
+            if name in layers
+        }
+        labels_color = None
+        if "labelled" in images:
+            # the labels are painted in place
+            images["labelled"] = np.array(images["labelled"])
+            labels_color = colorize_labels(layers["labelled"], images["labelled"])
+
+        return {
+            "revisions": self._revisions(),
+            "karyotype": layers[0].data,
+            "images": images,
+            "labels_color": labels_color,
+            "params": self._params(),
+            "table": model.dataframe.copy() if self.table.isEnabled() else None,
+            "genome_size": model.genomeSize,
+            "matching": self._matching(),
+        }
+
+    def _matching(self):
+        return getattr(
+            getattr(self.analysis_widget, "analysis_result", None), "matching", None
         )
 
-        params.to_csv(f"{path}/params.csv", header=False)
+    def _token(self, obj):
+        """Return a random token that identifies `obj` while it is alive.
 
-    def _save_table(self, path):
-        if self.table.isEnabled():
-            table = pd.DataFrame()
-            table["tag"] = self.table.model().dataframe["label"].to_list()
-            table["label"] = self.table.model().dataframe.index.to_list()
-            table["area"] = self.table.model().dataframe["area"].to_list()
-            table["size"] = self.table.model().dataframe["size"].to_list()
+        Objects that do not support weak references are hashed instead.
+        """
+        if obj is None:
+            return None
 
-            table.to_csv(f"{path}/data.csv", index=False)
+        entry = self._tokens.get(id(obj))
+        if entry is None or entry[0]() is not obj:
+            try:
+                entry = (weakref.ref(obj), uuid.uuid4().hex)
+            except TypeError:
+                return content_hash(obj)
+            self._tokens[id(obj)] = entry
 
-    def _save_matching(self, path):
-        if hasattr(self.analysis_widget, "analysis_result") and hasattr(
-            self.analysis_widget.analysis_result, "matching"
-        ):
-            self.analysis_widget.analysis_result.matching.to_csv(
-                f"{path}/matching.csv", index=False
+        return entry[1]
+
+    def _revisions(self):
+        """Return cheap keys of the current inputs of the artifacts, which tell
+        when their content hashes need to be recomputed (see `_input_hashes`).
+
+        Images that are only ever replaced are identified by their data,
+        the edited labels by the revision of their journal and the table
+        by the revision of its model.
+        """
+        self._tokens = {
+            key: entry for key, entry in self._tokens.items() if entry[0]() is not None
+        }
+        model = self.table.model()
+        layers = self.viewer.layers
+
+        revisions = {
+            "karyotype": self._token(layers[0].data),
+            "images": {
+                name: self._token(layers[name].data)
+                for name in ("inverted", "blurred", "thresholded")
+                if name in layers
+            },
+            "table": (self._token(model), model.revision),
+            "matching": self._token(self._matching()),
+        }
+        if "labelled" in layers:
+            layer = layers["labelled"]
+            journal = EditJournal.attach(layer)
+            revisions["images"]["labelled"] = (
+                self._token(layer.data),
+                journal.generation,
+                journal.revision,
             )
+            # the colors of labelled_color.png
+            revisions["labels_color"] = (
+                layer.color_mode,
+                layer.seed,
+                layer.num_colors,
+                layer.color,
+                layer.colormap.colors,
+            )
+
+        return revisions
+
+    def _input_hashes(self, snapshot):
+        """Return content hashes of the inputs in `snapshot`.
+
+        The hashes do not depend on the session, so the manifest stays valid
+        across restarts. An input is only hashed again if its revision (see
+        `_revisions`) changed since the last save.
+        """
+        revisions = snapshot["revisions"]
+        inputs = {
+            "karyotype": (revisions["karyotype"], snapshot["karyotype"]),
+            "table": (
+                (revisions["table"], snapshot["table"] is None),
+                snapshot["table"],
+            ),
+            "matching": (revisions["matching"], snapshot["matching"]),
+            **{
+                f"images/{name}": (revisions["images"][name], image)
+                for name, image in snapshot["images"].items()
+            },
+        }
+
+        hashes = {}
+        for key, (revision, data) in inputs.items():
+            cached = self._hashes.get(key)
+            if cached is None or cached[0] != revision:
+                cached = self._hashes[key] = (revision, content_hash(data))
+            hashes[key] = cached[1]
+        # the color settings are small and hashed as they are
+        hashes["labels_color"] = content_hash(revisions.get("labels_color"))
+
+        return hashes
+
+    def _artifact_inputs(self, method, snapshot, hashes):
+        """Return the inputs (or their `hashes`) of the artifacts of `method`
+        and the names of the files it writes."""
+        table = snapshot["table"]
+
+        if method == "_save_images":
+            names = list(snapshot["images"])
+            files = pipeline.image_files(names, self.image_format)
+            if "labelled" in names:
+                files.append("labelled_color.png")
+
+            return (
+                self.image_format,
+                {name: hashes[f"images/{name}"] for name in names},
+                hashes["labels_color"],
+            ), files
+
+        elif method == "_save_params":
+            return snapshot["params"], ["params.csv"]
+
+        elif method == "_save_table":
+            if table is None:
+                return None, []
+            return hashes["table"], ["data.csv"]
+
+        elif method == "_save_table_columnar":
+            if table is None or not has_pyarrow():
+                return None, []
+            return (
+                (self.table_format, hashes["table"], snapshot["params"]),
+                [f"data{table_formats[self.table_format]}"],
+            )
+
+        elif method == "_save_matching":
+            if snapshot["matching"] is None:
+                return None, []
+            return hashes["matching"], ["matching.csv"]
+
+        elif method in ("_save_annotated_karyotype", "_save_annotated_png"):
+            if table is None:
+                return None, []
+            inputs = (hashes["karyotype"], hashes["table"])
+            if method == "_save_annotated_karyotype":
+                return (
+                    (inputs, self.svg_options),
+                    pipeline.annotated_karyotype_files(**self.svg_options),
+                )
+            else:
+                return inputs, ["annotated.png"]
+
+    def _save_images(self, path, snapshot):
+        """Write the intermediate and label images as `image_format` (see
+        `pipeline.save_images`)."""
+        pipeline.save_images(
+            path,
+            snapshot["images"],
+            image_format=self.image_format,
+            labels_color=snapshot["labels_color"],
+        )
+
+    def _params(self):
+        return {
+            "invert_image": self.preprocessing_widget.invert_image(),
+            "threshold": self.preprocessing_widget.threshold(),
+            "blur": self.preprocessing_widget.sigma(),
+            "genome_size": self.table.model().genomeSize,
+        }
+
+    def _save_params(self, path, snapshot):
+        pipeline.save_params(path, snapshot["params"])
+
+    def _save_table(self, path, snapshot):
+        if snapshot["table"] is not None:
+            pipeline.save_table(path, snapshot["table"])
+
+    def _save_table_columnar(self, path, snapshot):
+        if snapshot["table"] is None:
+            return
+        if not has_pyarrow():
+            print("[_save_table_columnar]: pyarrow is not installed; skipping")
+            return
+
+        pipeline.save_table_columnar(
+            path, snapshot["table"], snapshot["params"], self.table_format
+        )
+
+    def _save_matching(self, path, snapshot):
+        if snapshot["matching"] is not None:
+            pipeline.save_matching(path, snapshot["matching"])
 
     def _save_screenshot(self, path):
         self.viewer.screenshot(f"{path}/screenshot.png")
 
-    def _save_annotated_karyotype(self, path):
-        if self.table.isEnabled():
-            table = self.table.model()
-            nrows = table.rowCount()
-            label_col = table.columns.get_loc("label")
-            size_col = table.columns.get_loc("size")
-            anno_tags = [table.data(row=i, column=label_col) for i in range(nrows)]
-            anno_sizes = [table.data(row=i, column=size_col) for i in range(nrows)]
-            anno_bboxes = table.dataframe["_bbox"].to_list()
-
-            export_svg(
-                f"{path}/annotated.svg",
-                karyotype=self.viewer.layers[0].data,
-                tags=anno_tags,
-                sizes=anno_sizes,
-                bboxes=anno_bboxes,
+    def _save_annotated_karyotype(self, path, snapshot):
+        if snapshot["table"] is not None:
+            pipeline.save_annotated_karyotype(
+                path,
+                snapshot["karyotype"],
+                snapshot["table"],
+                snapshot["genome_size"],
+                **self.svg_options,
+            )
+
+    def _save_annotated_png(self, path, snapshot):
+        if snapshot["table"] is not None:
+            pipeline.save_annotated_png(
+                path,
+                snapshot["karyotype"],
+                snapshot["table"],
+                snapshot["genome_size"],
             )
@@ -0,0 +1,54 @@
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from napari_kics.autotune import autotune, score_components
+
+
+def test_score_components():
+    assert score_components([10] * 4, 4) == 0
+    # a speck does not count as a chromosome but costs its area
+    assert score_components([10] * 4 + [1], 4) == 1 / 41
+    # two merged chromosomes
+    assert score_components([10, 10, 20], 4) == 0.25
+    assert score_components([], 4) == np.inf
+
+
+def test_autotune_finds_blobs():
+    rng = np.random.default_rng(0)
+    image = np.ones((120, 160))
+    for row in (20, 70):
+        for col in range(15, 160, 30):
+            image[row : row + 35, col : col + 12] = 0.3
+    image = np.clip(image + rng.normal(0, 0.2, image.shape), 0, 1)
+
+    results = autotune(
+        image, 10, sigmas=(0, 1, 2), thresholds=(0.2, 0.4, 0.6, 0.8), jobs=2
+    )
+
+    best = results.iloc[0]
+    assert best["num_components"] == 10
+    assert not best["invert_image"]
+    assert best["score"] < 0.05
+    assert results["score"].is_monotonic_increasing
+
+
+def test_autotune_rejects_empty_grids():
+    with pytest.raises(ValueError):
+        autotune(np.ones((10, 10)), 4, sigmas=())
+    with pytest.raises(ValueError):
+        autotune(np.ones((10, 10)), 4, invert_image=())
+
+
+def test_autotune_workers_do_not_import_napari_or_pandas():
+    # the spawned workers import the module of the tasks
+    code = (
+        "import sys, napari_kics.autotune; "
+        "print(sorted({'napari', 'pandas'} & set(sys.modules)))"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    ).stdout
+    assert output.strip() == "[]"
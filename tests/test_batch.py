@@ -0,0 +1,100 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from skimage import io
+
+from napari_kics import batch, pipeline
+
+sample_image = os.path.join(
+    os.path.dirname(pipeline.__file__), "resources", "data", "mHomSap_male.jpeg"
+)
+
+
+def test_run_batch_resumes(tmp_path):
+    input_dir = tmp_path / "input"
+    output_dir = tmp_path / "output"
+    input_dir.mkdir()
+    image = io.imread(sample_image)[:330, :900]
+    io.imsave(input_dir / "a.png", image)
+    io.imsave(input_dir / "b.png", np.ascontiguousarray(image[:, ::-1]))
+    (input_dir / "notes.txt").write_text("not an image")
+
+    params = {"threshold": 0.5, "blur": 0.5, "genome_size": 1000}
+    file_params = {"b.png": {"genome_size": 2000}}
+    assert (
+        batch.run_batch(
+            input_dir, output_dir, params=params, file_params=file_params, jobs=2
+        )
+        == []
+    )
+
+    for name in ("a_png", "b_png"):
+        for fname in ("params.csv", "data.csv", "labelled.tiff", "annotated.svg"):
+            assert (output_dir / name / fname).exists()
+    params_b = pd.read_csv(
+        output_dir / "b_png" / "params.csv", header=None, index_col=0
+    )
+    assert int(params_b.loc["genome_size", 1]) == 2000
+
+    # finished images are skipped, removed outputs are written again
+    mtime_a = os.stat(output_dir / "a_png" / "data.csv").st_mtime_ns
+    (output_dir / "b_png" / "data.csv").unlink()
+    assert (
+        batch.run_batch(
+            input_dir, output_dir, params=params, file_params=file_params, jobs=2
+        )
+        == []
+    )
+    assert os.stat(output_dir / "a_png" / "data.csv").st_mtime_ns == mtime_a
+    assert (output_dir / "b_png" / "data.csv").exists()
+
+
+def test_run_batch_keeps_images_with_the_same_stem_apart(tmp_path):
+    input_dir = tmp_path / "input"
+    output_dir = tmp_path / "output"
+    input_dir.mkdir()
+    image = io.imread(sample_image)[:330, :450]
+    io.imsave(input_dir / "a.png", image)
+    io.imsave(input_dir / "a.tif", np.ascontiguousarray(image[:, ::-1]))
+    # stale files of an earlier run are not part of the checkpoint
+    (output_dir / "a_png").mkdir(parents=True)
+    (output_dir / "a_png" / "stale.txt").write_text("stale")
+
+    assert batch.run_batch(input_dir, output_dir, jobs=1) == []
+
+    checkpoint = json.loads((output_dir / "manifest.json").read_text())
+    for fname, name in (("a.png", "a_png"), ("a.tif", "a_tif")):
+        files = checkpoint[fname]["files"]
+        assert all(f.startswith(name + "/") for f in files)
+        assert all((output_dir / f).exists() for f in files)
+        assert f"{name}/data.csv" in files
+        assert f"{name}/stale.txt" not in files
+
+
+def test_read_params(tmp_path):
+    (tmp_path / "params.csv").write_text(
+        "file,threshold,invert_image,genome_size\na.png,0.3,True,\nb.png,,False,100\n"
+    )
+
+    assert batch.read_params(tmp_path / "params.csv") == {
+        "a.png": {"threshold": 0.3, "invert_image": True},
+        "b.png": {"invert_image": False, "genome_size": 100},
+    }
+
+    # a column with blanks is not read as bool
+    for false, true in (("False", "True"), ("no", "yes"), ("0", "1")):
+        (tmp_path / "params.csv").write_text(
+            f"file,invert_image\na.png,{false}\nb.png,{true}\nc.png,\n"
+        )
+        assert batch.read_params(tmp_path / "params.csv") == {
+            "a.png": {"invert_image": False},
+            "b.png": {"invert_image": True},
+            "c.png": {},
+        }
+
+    (tmp_path / "params.csv").write_text("file,invert_image\na.png,maybe\n")
+    with pytest.raises(ValueError):
+        batch.read_params(tmp_path / "params.csv")
@@ -0,0 +1,154 @@
+import napari
+import numpy as np
+
+from napari_kics.utils import EditJournal, LabelEdit, OrderAction, replace_label
+
+
+def test_label_edit_round_trip():
+    rng = np.random.default_rng(0)
+    labels = rng.integers(0, 4, (20, 30))
+    original = labels.copy()
+
+    flat_indices = rng.choice(labels.size, 150, replace=False)
+    old_values = labels.ravel()[flat_indices]
+    new_values = rng.integers(0, 4, 150)
+    edit = LabelEdit(labels.shape, flat_indices, old_values, new_values)
+
+    edit.apply(labels, +1)
+    expected = original.copy()
+    expected.ravel()[flat_indices] = new_values
+    assert np.array_equal(labels, expected)
+    assert len(edit) == np.count_nonzero(old_values != new_values)
+
+    edit.apply(labels, -1)
+    assert np.array_equal(labels, original)
+
+
+def test_edit_journal_records_layer_edits():
+    labels = np.repeat(np.arange(5), 5).reshape(5, 5)
+    layer = napari.layers.Labels(labels.copy())
+    journal = EditJournal.attach(layer)
+    reader = journal.subscribe()
+
+    layer.fill((0, 0), 5)
+    [(edit, direction)] = reader.read()
+    assert direction == +1
+    assert edit.old_values().tolist() == [0] * 5
+    assert edit.new_values().tolist() == [5] * 5
+
+    journal.undo()
+    assert np.array_equal(layer.data, labels)
+    assert [direction for _, direction in reader.read()] == [-1]
+
+    journal.redo()
+    assert np.count_nonzero(layer.data == 5) == 5
+    assert reader.read() == [(edit, +1)]
+    assert reader.read() == []
+
+    # a stroke is recorded as a single step
+    with layer.block_history():
+        layer.paint((1, 1), 7)
+        layer.paint((3, 3), 7)
+    assert len(journal.steps) == 2
+    journal.undo()
+    assert np.count_nonzero(layer.data == 7) == 0
+    assert len(reader.read()) == 2
+    # every recorded, undone and redone edit is a new revision
+    assert journal.revision == 5
+
+
+def test_edit_journal_replaces_napari_history():
+    labels = np.repeat(np.arange(5), 5).reshape(5, 5)
+    layer = napari.layers.Labels(labels.copy())
+    journal = EditJournal.attach(layer)
+
+    layer.fill((0, 0), 5)
+    with layer.block_history():
+        layer.paint((3, 3), 7)
+    assert len(journal.steps) == 2
+    # napari keeps no copies of the edits
+    assert len(layer._undo_history) == 0
+    assert len(layer._redo_history) == 0
+
+    # undo and redo of the layer go through the journal
+    layer.undo()
+    assert journal.position == 1
+    assert np.count_nonzero(layer.data == 7) == 0
+    layer.undo()
+    assert np.array_equal(layer.data, labels)
+    layer.redo()
+    assert journal.position == 1
+    assert np.count_nonzero(layer.data == 5) == 5
+    assert len(layer._undo_history) == 0
+
+
+def test_edit_journal_groups_steps():
+    journal = EditJournal()
+    reader = journal.subscribe()
+
+    journal.begin_step()
+    journal.record(OrderAction([3, 4], 0))
+    journal.record(OrderAction([7], 0))
+    journal.end_step()
+    journal.record(OrderAction([1], 1))
+    assert len(journal.steps) == 2
+    assert len(reader.read()) == 3
+
+    journal.undo()
+    journal.undo()
+    events = reader.read()
+    assert [action.labels.tolist() for action, _ in events] == [[1], [7], [3, 4]]
+    assert all(direction == -1 for _, direction in events)
+
+    # recording discards the undone steps
+    journal.record(OrderAction([2], 0))
+    assert not journal.can_redo()
+    assert len(journal.steps) == 1
+
+
+def test_replace_label_history_is_compact_and_exact():
+    rng = np.random.default_rng(1)
+    labels = np.repeat(np.arange(1, 9), 50 * 400).reshape(400, 400)
+    labels[rng.random(labels.shape) < 0.01] = 0
+    original = labels.copy()
+    layer = napari.layers.Labels(labels)
+
+    replace_label(layer, [2, 5, 7], 0)
+    replace_label(layer, 3, 4)
+    expected = layer.data.copy()
+
+    journal = EditJournal.attach(layer)
+    assert len(journal.steps) == 2
+    assert journal.nbytes < 0.01 * original.nbytes
+
+    journal.undo()
+    journal.undo()
+    assert np.array_equal(layer.data, original)
+    journal.redo()
+    journal.redo()
+    assert np.array_equal(layer.data, expected)
+
+
+def test_label_edit_from_fragmented_mask_uses_bitmask():
+    rng = np.random.default_rng(2)
+    labels = rng.integers(1, 3, (64, 64))
+    original = labels.copy()
+    mask = labels == 1
+
+    edit = LabelEdit.from_mask(labels, mask, 0)
+    assert edit.bitmask is not None
+    assert edit.nbytes <= mask.size // 8 + 64
+
+    labels[mask] = 0
+    edit.apply(labels, -1)
+    assert np.array_equal(labels, original)
+
+
+def test_edit_journal_memory_cap():
+    journal = EditJournal(max_bytes=100)
+    for i in range(10):
+        journal.record(OrderAction(np.arange(5), i))
+
+    assert journal.nbytes <= 100
+    assert 1 <= len(journal.steps) < 10
+    assert journal.position == len(journal.steps)
@@ -0,0 +1,100 @@
+import numpy as np
+from qtpy import QtCore
+
+from napari_kics.models.estimates_table_model import EstimatesTableModel
+
+
+def make_model(ids):
+    model = EstimatesTableModel(lambda id: None)
+    model.initData(
+        ids=ids,
+        labels=[str(id) for id in ids],
+        areas=np.arange(1, len(ids) + 1, dtype=np.float64) * 10,
+        bboxes=[(0, 0, 1, 1)] * len(ids),
+    )
+
+    return model
+
+
+def assert_rows_match(model, ids):
+    expected = [
+        model.dataframe.index.get_loc(id) if id in model.dataframe.index else -1
+        for id in ids
+    ]
+    assert model.rowsForIds(ids).tolist() == expected
+
+
+def test_rows_for_ids_follow_inserts_removals_and_sorts():
+    for ids in ([3, 1, 7, 2], [5, 10**12, 42]):
+        model = make_model(ids)
+        probe = ids + [0, 4, 10**9, 17]
+        assert_rows_match(model, probe)
+
+        model.insertRow(17, area=100, bbox=(0, 0, 2, 2))
+        assert_rows_match(model, probe)
+
+        model.removeRow(ids[0])
+        assert_rows_match(model, probe)
+
+        model.sort(
+            EstimatesTableModel.columns.get_loc("area"), QtCore.Qt.AscendingOrder
+        )
+        assert_rows_match(model, probe)
+
+
+def test_revision_counts_changes():
+    model = make_model([3, 1, 7])
+    revisions = [model.revision]
+
+    def changed():
+        revisions.append(model.revision)
+        return revisions[-1] > revisions[-2]
+
+    model.insertRow(17, area=100, bbox=(0, 0, 2, 2))
+    assert changed()
+    model.setColumn("label", [3, 1], ["1a", "1b"])
+    assert changed()
+    with model.bulkChanges() as bulkChanges:
+        bulkChanges.removeRow(7)
+    assert changed()
+    model.sort(EstimatesTableModel.columns.get_loc("area"), QtCore.Qt.AscendingOrder)
+    assert changed()
+    model.genomeSize = 1000
+    assert changed()
+    model.bboxes()
+    assert not changed()
+
+    emitted = []
+    model.sigChange.connect(lambda *change: emitted.append(change))
+    with model.bulkChanges():
+        model.setColumn("area", [], [])
+        model.setColumn("_bbox", [], [])
+    assert not changed()
+    assert emitted == []
+
+
+def test_rows_for_ids_are_updated_incrementally():
+    rng = np.random.default_rng(0)
+    model = make_model([3, 1, 7, 2])
+
+    for step in range(200):
+        ids = model.dataframe.index.to_numpy()
+        if step == 150:
+            # a sparse id turns the dense lookup into a dict
+            model.insertRow(10**12 + step, area=1, bbox=(0, 0, 1, 1))
+        elif rng.random() < 0.5 and len(ids) > 1:
+            model.removeRow(rng.choice(ids))
+        else:
+            model.insertRow(step + 10, area=1, bbox=(0, 0, 1, 1))
+        if step in (100, 149, 151, 199):
+            assert isinstance(model._rowIndex, dict) == (step > 150)
+
+        assert_rows_match(model, list(range(250)) + [10**12 + 150])
+
+
+def test_set_column_keeps_numeric_dtype():
+    model = make_model([3, 1, 7])
+    model.setColumn("area", [7, 3], [5, 6])
+
+    assert model.dataframe["area"].dtype == np.float64
+    assert model.dataframe["area"].tolist() == [6, 20, 5]
@@ -0,0 +1,77 @@
+import base64
+import re
+
+import imageio.v3 as iio
+import numpy as np
+
+from napari_kics.utils.export_annotated_karyotype import export_svg
+from napari_kics.utils.render_annotated_karyotype import render_annotated_karyotype
+
+annotations = {
+    "tags": ["01a", "01b"],
+    "sizes": ["10.0 Mb", "9.5 Mb"],
+    "bboxes": [(5, 10, 40, 30), (8, 35, 45, 60)],
+}
+
+
+def embedded_image(fname):
+    with open(fname) as svg:
+        content = svg.read()
+    mime_type, data = re.search(r'href="data:([^;]+);base64,([^"]*)"', content).groups()
+
+    return mime_type, iio.imread(base64.standard_b64decode(data))
+
+
+def test_export_svg_embeds_full_resolution_png(tmp_path):
+    karyotype = np.random.default_rng(0).integers(0, 256, (50, 80, 3), dtype=np.uint8)
+    export_svg(tmp_path / "annotated.svg", karyotype, **annotations)
+
+    mime_type, image = embedded_image(tmp_path / "annotated.svg")
+    assert mime_type == "image/png"
+    assert np.array_equal(image, karyotype)
+
+
+def test_export_svg_downsamples_and_links(tmp_path):
+    karyotype = np.full((500, 800, 3), 200, dtype=np.uint8)
+
+    export_svg(
+        tmp_path / "small.svg",
+        karyotype,
+        **annotations,
+        svg_width=100,
+        oversampling=2,
+        image_format="jpeg",
+    )
+    mime_type, image = embedded_image(tmp_path / "small.svg")
+    assert mime_type == "image/jpeg"
+    assert image.shape == (125, 200, 3)
+
+    export_svg(tmp_path / "linked.svg", karyotype, **annotations, external_image=True)
+    assert 'href="linked_karyotype.png"' in (tmp_path / "linked.svg").read_text()
+    assert np.array_equal(iio.imread(tmp_path / "linked_karyotype.png"), karyotype)
+
+
+def test_render_annotated_karyotype_draws_outlines_and_text():
+    karyotype = np.full((400, 500), 255, dtype=np.uint8)
+    image = render_annotated_karyotype(
+        karyotype, ["01a"], ["12.0 Mb"], [(100, 50, 300, 150)], display_width=500
+    )
+
+    red = np.all(image == [255, 0, 0], axis=-1)
+    assert image.shape == (400, 500, 3)
+    assert red[100, 50:151].all() and red[300, 50:151].all()
+    assert red[100:301, 50].all() and red[100:301, 150].all()
+    assert not red[101:300, 51:150].any()
+    # the text is drawn above the box
+    assert (image[:95, 50:] != 255).any()
+    assert (image[95:100] == 255).all()
+
+
+def test_render_annotated_karyotype_clips_float_images():
+    karyotype = np.linspace(-0.5, 1.5, 200 * 100).reshape(200, 100)
+    image = render_annotated_karyotype(
+        karyotype, [], [], np.empty((0, 4)), color="#00ff00"
+    )
+
+    assert image.dtype == np.uint8
+    assert image[0, 0, 0] == 0 and image[-1, -1, 0] == 255
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from napari_kics.utils.guess_chromosome_labels import (
+    ChromosomeLabel,
+    guess_chromosome_labels,
+    guess_chromosome_labels_reference,
+    guess_test_cases,
+)
+
+
+@pytest.mark.parametrize("test_case", guess_test_cases(), ids=lambda tc: tc["name"])
+def test_guess_chromosome_labels_matches_reference(test_case):
+    bboxes = test_case["bboxes"]
+
+    assert guess_chromosome_labels(bboxes) == guess_chromosome_labels_reference(bboxes)
+
+
+def test_guess_chromosome_labels_random_layouts():
+    rng = np.random.default_rng(42)
+
+    for _ in range(200):
+        n = rng.integers(1, 60)
+        y0 = rng.integers(0, 500, n)
+        x0 = rng.integers(0, 800, n)
+        bboxes = np.stack(
+            [y0, x0, y0 + rng.integers(1, 80, n), x0 + rng.integers(1, 60, n)],
+            axis=1,
+        )
+        bboxes = [tuple(bbox) for bbox in bboxes.tolist()]
+
+        assert guess_chromosome_labels(bboxes) == guess_chromosome_labels_reference(
+            bboxes
+        )
+
+
+@pytest.mark.parametrize("test_case", guess_test_cases(), ids=lambda tc: tc["name"])
+def test_guess_chromosome_labels_diploid_partition(test_case):
+    bboxes = test_case["bboxes"]
+    labels = guess_chromosome_labels(bboxes, ploidy=2)
+    combined = sorted(zip(labels, bboxes), key=lambda x: (x[0].row, x[0].col, x[1][1]))
+
+    assert [label for label, _ in combined] == test_case["expected"]
+
+
+def test_guess_chromosome_labels_tetraploid_partition():
+    rng = np.random.default_rng(7)
+    bboxes, groups = [], []
+    x = 0
+    for group in range(10):
+        height, width = rng.integers(30, 200), rng.integers(20, 50)
+        for _ in range(4):
+            bboxes.append((0, x, height, x + width))
+            groups.append(group)
+            x += width + rng.integers(2, 15)
+        x += rng.integers(25, 80)
+
+    labels = guess_chromosome_labels(bboxes, ploidy=4)
+
+    assert [label.major - 1 for label in labels] == groups
+    assert [label.minor for label in labels] == [0, 1, 2, 3] * 10
+
+
+def test_chromosome_label_minor_beyond_z():
+    for minor, string in ((25, "01z"), (26, "01aa"), (701, "01zz"), (702, "01aaa")):
+        assert str(ChromosomeLabel(1, minor)) == string
+        assert ChromosomeLabel.from_string(string) == ChromosomeLabel(1, minor)
@@ -0,0 +1,51 @@
+import numpy as np
+import zarr
+
+from napari_kics.utils.image_io import (
+    minimal_label_dtype,
+    read_tiff,
+    read_zarr,
+    to_ubyte,
+    write_tiff,
+    write_zarr,
+)
+
+
+def test_minimal_label_dtype():
+    assert minimal_label_dtype(np.array([0, 255])) == np.uint8
+    assert minimal_label_dtype(np.array([0, 256])) == np.uint16
+    assert minimal_label_dtype(np.zeros((2, 2), dtype=np.int64)) == np.uint8
+
+
+def test_to_ubyte_clips():
+    np.testing.assert_array_equal(
+        to_ubyte(np.array([-0.5, 0.0, 1.0, 1.5])), [0, 0, 255, 255]
+    )
+
+
+def test_tiff_round_trip(tmp_path):
+    rng = np.random.default_rng(0)
+    labels = rng.integers(0, 300, (300, 500)).astype(np.uint16)
+    mask = rng.random((300, 500)) > 0.5
+
+    write_tiff(tmp_path / "labels.tiff", labels, tile=(64, 64))
+    write_tiff(tmp_path / "mask.tiff", mask, tile=(64, 64))
+
+    np.testing.assert_array_equal(read_tiff(tmp_path / "labels.tiff"), labels)
+    read_mask = read_tiff(tmp_path / "mask.tiff")
+    assert read_mask.dtype == bool
+    np.testing.assert_array_equal(read_mask, mask)
+
+
+def test_zarr_round_trip(tmp_path):
+    rng = np.random.default_rng(0)
+    labels = rng.integers(0, 300, (300, 500)).astype(np.uint16)
+    mask = rng.random((300, 501)) > 0.5
+
+    write_zarr(tmp_path / "images.zarr", "labels", labels, chunks=(64, 64))
+    write_zarr(tmp_path / "images.zarr", "mask", mask, chunks=(64, 64))
+
+    group = zarr.open_group(str(tmp_path / "images.zarr"), mode="r")
+    assert group["mask"].nbytes <= mask.size // 8 + 300
+    np.testing.assert_array_equal(read_zarr(group["labels"]), labels)
+    np.testing.assert_array_equal(read_zarr(group["mask"]), mask)
@@ -0,0 +1,29 @@
+import numpy as np
+import pandas as pd
+
+from napari_kics.utils.manifest import Manifest, content_hash
+
+
+def test_content_hash_tracks_content():
+    image = np.arange(12).reshape(3, 4)
+    table = pd.DataFrame({"area": [1.0, 2.0]}, index=[3, 5])
+
+    assert content_hash(image, table) == content_hash(image.copy(), table.copy())
+    assert content_hash(image) != content_hash(image.reshape(4, 3))
+    assert content_hash(image) != content_hash(image.astype(np.int8))
+    assert content_hash(table) != content_hash(table.assign(area=[1.0, 3.0]))
+
+
+def test_manifest_detects_stale_artifacts(tmp_path):
+    (tmp_path / "data.csv").write_text("")
+    manifest = Manifest(tmp_path)
+    manifest.update("_save_table", "abc", ["data.csv"])
+    manifest.save()
+
+    manifest = Manifest(tmp_path)
+    assert manifest.is_current("_save_table", "abc")
+    assert not manifest.is_current("_save_table", "def")
+    assert not manifest.is_current("_save_params", "abc")
+
+    (tmp_path / "data.csv").unlink()
+    assert not manifest.is_current("_save_table", "abc")
@@ -0,0 +1,98 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+from skimage import io
+from skimage.measure import regionprops
+
+from napari_kics import pipeline
+
+sample_image = os.path.join(
+    os.path.dirname(pipeline.__file__), "resources", "data", "mHomSap_male.jpeg"
+)
+
+
+def test_table_from_labels_matches_regionprops():
+    labels = np.zeros((20, 30), dtype=np.int32)
+    labels[1:5, 2:9] = 4
+    labels[10:18, 20:22] = 2
+    labels[12, 5] = 2
+
+    table = pipeline.table_from_labels(labels, genome_size=100)
+
+    props = {prop.label: prop for prop in regionprops(labels)}
+    assert list(table.index) == [4, 2]
+    for id in table.index:
+        assert table.loc[id, "area"] == props[id].area
+        assert table.loc[id, "_bbox"] == props[id].bbox
+    np.testing.assert_allclose(table["size"].sum(), 100)
+
+
+def test_run_and_save(tmp_path):
+    image = io.imread(sample_image)
+    result = pipeline.run(image, {"threshold": 0.5, "blur": 0.5, "genome_size": 3000})
+
+    table = result["table"]
+    assert len(table) > 40
+    assert str(table["label"].iloc[0]) == "01a"
+    assert (table["count"] >= 1).all()
+    np.testing.assert_allclose((table["size"] / table["count"]).sum(), 3000, rtol=1e-6)
+
+    estimates = pipeline.chromosome_estimates(table, [], genome_size=3000)
+    assert estimates.index[0] == "1"
+
+    pipeline.save_results(tmp_path, image, result)
+    for fname in (
+        "inverted.png",
+        "labelled.tiff",
+        "params.csv",
+        "data.csv",
+        "annotated.svg",
+        "annotated.png",
+    ):
+        assert (tmp_path / fname).exists()
+    data = pd.read_csv(tmp_path / "data.csv")
+    assert data["label"].tolist() == table.index.tolist()
+
+
+def test_save_linked_svg_and_png_side_by_side(tmp_path):
+    image = io.imread(sample_image)
+    table = pipeline.run(image, {"threshold": 0.5, "blur": 0.5})["table"]
+    svg_options = {"external_image": True}
+
+    svg_files = pipeline.save_annotated_karyotype(tmp_path, image, table, **svg_options)
+    png_files = pipeline.save_annotated_png(tmp_path, image, table)
+    assert svg_files == pipeline.annotated_karyotype_files(**svg_options)
+    assert svg_files == ["annotated.svg", "annotated_karyotype.png"]
+    assert png_files == ["annotated.png"]
+
+    # the SVG links the plain karyotype, not the rendered annotations
+    assert 'href="annotated_karyotype.png"' in (tmp_path / "annotated.svg").read_text()
+    assert np.array_equal(io.imread(tmp_path / "annotated_karyotype.png"), image)
+    assert not np.array_equal(io.imread(tmp_path / "annotated.png")[..., :3], image)
+
+
+def test_labels_to_rgba_matches_labels_layer():
+    import napari
+
+    from napari_kics.utils import colorize_labels
+
+    labels = np.random.default_rng(3).integers(0, 200, (30, 40))
+    for labels in (labels, labels * 10**9):
+        expected = colorize_labels(napari.layers.Labels(labels))
+        assert np.array_equal(pipeline.labels_to_rgba(labels), expected)
+
+
+def test_pipeline_does_not_import_napari():
+    # batch workers run the pipeline without a viewer
+    code = (
+        "import sys, numpy, napari_kics.pipeline as p; "
+        "p.labels_to_rgba(numpy.arange(12).reshape(3, 4)); "
+        "print('napari' in sys.modules)"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    ).stdout
+    assert output.strip() == "False"
@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+
+from napari_kics.utils.guess_chromosome_labels import ChromosomeLabel
+from napari_kics.utils.session import load_session, save_session
+
+
+def test_session_round_trip(tmp_path):
+    image = np.random.default_rng(0).integers(0, 256, (40, 30), dtype=np.uint8)
+    labels = np.zeros((40, 30), dtype=np.int32)
+    labels[2:10, 3:8] = 1
+    labels[20:30, 10:20] = 300
+    table = {
+        "ids": np.array([1, 300]),
+        "labels": [ChromosomeLabel.from_string("01a"), "300"],
+        "counts": np.array([1, 2]),
+        "areas": np.array([40.0, 100.0]),
+        "bboxes": np.array([[2, 3, 10, 8], [20, 10, 30, 20]]),
+    }
+    matching = pd.DataFrame({"scaffold": ["chr1", "chr2"], "label": [1, 300]})
+
+    save_session(
+        tmp_path / "session.zarr",
+        image=image,
+        image_name="karyotype",
+        labels=labels,
+        table=table,
+        params={"invert_image": True, "blur": np.float64(0.5), "threshold": 0.3},
+        layers={"blurred": image / 255.0},
+        genome_size=3100,
+        matching=matching,
+        chunks=(16, 16),
+    )
+    session = load_session(tmp_path / "session.zarr")
+
+    assert session["image_source"] is None
+    assert session["image_name"] == "karyotype"
+    assert session["params"] == {"invert_image": True, "blur": 0.5, "threshold": 0.3}
+    assert session["genome_size"] == 3100
+    np.testing.assert_array_equal(session["image"][:], image)
+    assert session["labels"].dtype == np.uint16
+    np.testing.assert_array_equal(session["labels"][:], labels)
+    assert session["layers"]["blurred"].dtype == np.float32
+    np.testing.assert_allclose(session["layers"]["blurred"][:], image / 255.0, 1e-6)
+    for column in ("ids", "counts", "areas", "bboxes"):
+        np.testing.assert_array_equal(session["table"][column], table[column])
+    assert session["table"]["labels"] == table["labels"]
+    pd.testing.assert_frame_equal(session["matching"], matching)
+
+
+def test_session_keeps_image_of_removed_source(tmp_path):
+    image = np.random.default_rng(1).integers(0, 256, (20, 10), dtype=np.uint8)
+    source = tmp_path / "karyotype.png"
+    source.touch()
+    table = {
+        column: np.zeros((0, 4) if column == "bboxes" else 0)
+        for column in ("ids", "labels", "counts", "areas", "bboxes")
+    }
+
+    save_session(
+        tmp_path / "session.zarr",
+        image=image,
+        image_source=source,
+        labels=np.zeros_like(image, dtype=np.int32),
+        table=table,
+        params={},
+    )
+    source.unlink()
+    session = load_session(tmp_path / "session.zarr")
+
+    assert session["image_source"] == str(source)
+    np.testing.assert_array_equal(session["image"][:], image)
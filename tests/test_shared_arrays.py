@@ -0,0 +1,71 @@
+import multiprocessing
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pytest
+
+from napari_kics.utils.shared_arrays import SharedArrayRegistry
+
+
+def _negate(source, target):
+    target.attach()[...] = -source.attach()
+    source.detach()
+    target.detach()
+
+
+def test_share_with_worker():
+    image = np.arange(12, dtype=np.float32).reshape(3, 4)
+
+    with SharedArrayRegistry() as registry, ProcessPoolExecutor(
+        max_workers=1, mp_context=multiprocessing.get_context("spawn")
+    ) as executor:
+        source = registry.share(image)
+        target = registry.empty(image.shape, image.dtype)
+        executor.submit(_negate, source, target).result()
+
+        np.testing.assert_array_equal(registry.array(target), -image)
+        np.testing.assert_array_equal(registry.array(source), image)
+
+
+def test_release_frees_last_reference():
+    registry = SharedArrayRegistry()
+    handle = registry.share(np.ones(5))
+    assert registry.acquire(handle) == handle
+
+    registry.release(handle)
+    assert len(registry) == 1
+    assert handle.attach().sum() == 5
+
+    registry.release(handle)
+    assert len(registry) == 0
+    with pytest.raises(FileNotFoundError):
+        handle.attach()
+
+
+def test_close_frees_all():
+    registry = SharedArrayRegistry()
+    handles = [registry.empty((2, 2), np.uint8), registry.share(np.zeros(3))]
+    handles[0].attach()
+
+    registry.close()
+    assert len(registry) == 0
+    for handle in handles:
+        with pytest.raises(FileNotFoundError):
+            handle.attach()
+
+
+def test_attach_from_other_process_keeps_segment():
+    with SharedArrayRegistry() as registry:
+        handle = registry.share(np.arange(4))
+        code = (
+            "from napari_kics.utils.shared_arrays import SharedArrayHandle; "
+            f"assert SharedArrayHandle{tuple(handle)!r}.attach().sum() == 6"
+        )
+        subprocess.run([sys.executable, "-c", code], check=True)
+        # the resource tracker of the other process cleans up after it exits
+        time.sleep(1)
+
+        assert handle.attach().sum() == 6
@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+
+from napari_kics.utils.guess_chromosome_labels import ChromosomeLabel
+from napari_kics.utils.table_export import export_table, read_table, table_columns
+
+pytest.importorskip("pyarrow")
+
+
+@pytest.mark.parametrize("table_format", ["parquet", "arrow"])
+def test_export_table_round_trip(tmp_path, table_format):
+    columns = table_columns(
+        ids=[3, 7],
+        labels=[ChromosomeLabel.from_string("02b"), "7"],
+        counts=[2, 1],
+        areas=[120.0, 80.0],
+        sizes=[60.0, 40.0],
+        bboxes=[(1, 2, 10, 12), (20, 5, 30, 9)],
+    )
+    fname = tmp_path / f"data.{table_format}"
+    export_table(fname, columns, {"threshold": 0.5}, table_format=table_format)
+
+    table, metadata = read_table(fname)
+    assert metadata == {"threshold": 0.5}
+    assert table.column("major").to_pylist() == [2, -1]
+    assert table.column("minor").to_pylist() == [1, -1]
+    assert table.column("label").to_pylist() == ["02b", "7"]
+    assert str(table.schema.field("bbox_max_col").type) == "int32"
+    np.testing.assert_array_equal(table.column("bbox_min_row").to_numpy(), [1, 20])
+    np.testing.assert_array_equal(table.column("count").to_numpy(), [2, 1])
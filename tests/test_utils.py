@@ -0,0 +1,126 @@
+import napari
+import numpy as np
+import pytest
+from skimage import img_as_ubyte
+
+from napari_kics.utils import (
+    LabelOccupancy,
+    LookupArray,
+    colorize_labels,
+    labels_on_line,
+    remap_labels,
+)
+from napari_kics.utils.label_history_processor import ChangeRecord
+
+
+def test_labels_on_line_preserves_crossing_order():
+    labels = np.zeros((5, 12), dtype=np.int_)
+    labels[:, 1:3] = 7
+    labels[:, 4:6] = 3
+    labels[:, 8:10] = 7
+    labels[:, 10:] = 5
+
+    crossed = labels_on_line(labels, (2, 0), (2.9, 11.5))
+    assert crossed.tolist() == [7, 3, 5]
+
+    crossed = labels_on_line(labels, (2, 11), (2, 0))
+    assert crossed.tolist() == [5, 7, 3]
+
+
+def test_labels_on_line_clips_to_image():
+    labels = np.arange(1, 10).reshape(3, 3)
+
+    crossed = labels_on_line(labels, (-2, -2), (5, 5))
+    assert crossed.tolist() == [1, 5, 9]
+
+
+def test_remap_labels_matches_sequential_replacement():
+    rng = np.random.default_rng(3)
+    labels = rng.integers(0, 50, (40, 60))
+
+    for offset in (0, 2**40):
+        image = labels + offset * (labels > 0)
+        old_labels = rng.choice(50, 12, replace=False) + offset
+        new_labels = rng.integers(0, 50, 12) + offset
+
+        expected = image.copy()
+        for old, new in zip(old_labels, new_labels):
+            expected[image == old] = new
+
+        where, values = remap_labels(image, old_labels, new_labels)
+        image[where] = values
+        assert np.array_equal(image, expected)
+        assert np.array_equal(where, image != labels + offset * (labels > 0))
+
+
+def test_label_occupancy_tracks_bboxes_through_edits():
+    rng = np.random.default_rng(4)
+    labels = rng.integers(0, 6, (30, 40))
+    occupancy = LabelOccupancy(labels)
+
+    for _ in range(50):
+        rows = rng.integers(0, 30, 20)
+        cols = rng.integers(0, 40, 20)
+        rows, cols = np.unique(np.stack([rows, cols]), axis=1)
+        new_label = rng.integers(0, 8)
+
+        for label in np.unique(labels[rows, cols]).tolist():
+            where = labels[rows, cols] == label
+            occupancy.update(label, rows[where], cols[where], -1)
+        occupancy.update(new_label, rows, cols, +1)
+        labels[rows, cols] = new_label
+
+        for label in range(1, 8):
+            coords = np.argwhere(labels == label)
+            if len(coords) == 0:
+                assert occupancy.bbox(label) is None
+            else:
+                assert occupancy.bbox(label) == (
+                    *coords.min(axis=0),
+                    *(coords.max(axis=0) + 1),
+                )
+                assert occupancy.area(label) == len(coords)
+
+
+def test_change_record_bbox():
+    record = ChangeRecord(3, np.array([4, 2, 7]), np.array([5, 9, 1]))
+
+    assert record.bbox() == (2, 1, 7, 9)
+    assert record.bbox((0, 3, 5, 12)) == (0, 1, 7, 12)
+
+
+def test_colorize_labels_matches_layer_colors():
+    labels = np.random.default_rng(5).integers(0, 30, (40, 50))
+    layer = napari.layers.Labels(labels)
+
+    expected = img_as_ubyte(layer.get_color(list(labels)))
+    assert np.array_equal(colorize_labels(layer), expected)
+
+    # sparse, very large ids
+    layer.data = labels * 10**12
+    expected = img_as_ubyte(layer.get_color(list(layer.data)))
+    assert np.array_equal(colorize_labels(layer), expected)
+
+
+def test_lookup_array_as_labels_layer_data():
+    labels = np.zeros((6, 8), dtype=np.int32)
+    labels[1:3, 1:4] = 5
+    labels[4:, 5:] = 2
+    lut = np.zeros(7, dtype=np.uint8)
+    lut[5] = 1
+
+    layer = napari.layers.Labels(LookupArray(labels, lut))
+    assert layer.data.shape == labels.shape
+    assert layer.data.dtype == np.uint8
+    assert np.array_equal(layer._slice.image.raw, labels == 5)
+
+    # edits of the lookup table and of the labels show after a refresh
+    lut[2] = 1
+    labels[0, 0] = 5
+    layer.refresh()
+    assert np.array_equal(layer._slice.image.raw, np.isin(labels, [2, 5]))
+
+    # the overlay is read-only; painting must not touch the labels
+    with pytest.raises(TypeError):
+        layer.paint((0, 7), 1)
+    assert labels[0, 7] == 0